@@ -0,0 +1,72 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.components.data_ingestion import convert_cols_to_int, parse_mileage
+
+
+# Run with `python -m benchmarks.ingestion_cleaning --rows 1000000 10000000 50000000`
+
+def isInt(x):
+    try:
+        return int(x)
+    except:
+        return None
+
+def legacy_convert_cols_to_int(df, cols:list):
+    # convert_cols_to_int before vectorization, kept as the reference
+    for col in cols:
+        df[col] = df[col].apply(isInt)
+        if df[col].isna().sum() > 0:
+            df[col] = df[col].fillna(df[col].mean())
+        df[col] = df[col].astype(int)
+
+def legacy_clean(df):
+    df.Mileage = df.Mileage.apply(lambda x: x.split()[0])
+    legacy_convert_cols_to_int(df, ['Levy', 'Mileage', 'Cylinders'])
+    return df
+
+def vectorized_clean(df):
+    df.Mileage = parse_mileage(df.Mileage)
+    convert_cols_to_int(df, ['Levy', 'Mileage', 'Cylinders'])
+    return df
+
+def make_frame(n_rows, seed=42):
+    """Synthetic rows shaped like the raw dataset's Levy, Mileage and Cylinders columns."""
+    rng = np.random.default_rng(seed)
+    levy = rng.integers(100, 3000, n_rows).astype(str).astype(object)
+    levy[rng.random(n_rows) < 0.3] = '-'
+    mileage = pd.Series(rng.integers(0, 500000, n_rows).astype(str)) + ' km'
+    cylinders = rng.choice([4.0, 6.0, 8.0, 12.0], n_rows)
+    return pd.DataFrame({'Levy': levy, 'Mileage': mileage.astype(object), 'Cylinders': cylinders})
+
+def timed(clean, df):
+    start = time.perf_counter()
+    result = clean(df)
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark ingestion cleaning, per-row apply vs vectorized')
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000, 10_000_000, 50_000_000])
+    parser.add_argument('--legacy-max-rows', type=int, default=10_000_000,
+                        help='skip the per-row version above this size, it takes minutes')
+    args = parser.parse_args()
+
+    print(f"{'rows':>12} {'apply (s)':>10} {'vectorized (s)':>15} {'speedup':>8}")
+    for n_rows in args.rows:
+        df = make_frame(n_rows)
+        vectorized, vectorized_seconds = timed(vectorized_clean, df.copy())
+
+        if n_rows > args.legacy_max_rows:
+            print(f"{n_rows:>12} {'-':>10} {vectorized_seconds:>15.2f} {'-':>8}")
+            continue
+
+        legacy, legacy_seconds = timed(legacy_clean, df)
+        pd.testing.assert_frame_equal(legacy, vectorized)
+        print(f"{n_rows:>12} {legacy_seconds:>10.2f} {vectorized_seconds:>15.2f} {legacy_seconds / vectorized_seconds:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,26 +1,94 @@
 import os
 import sys
 import json
+import numpy as np
 import pandas as pd
 
 from sklearn.model_selection import train_test_split
 from dataclasses import dataclass
+from typing import Optional
 
 from src.exception import CustomException
 from src.logger import logging
+from src.sketch import QuantileSketch
+from src.frames import FrameWriter, frame_format, save_frame
+from src.components.target_encoding import ENCODINGS_FILE, TargetMeanEncoder, column_encodings, save_encodings
 from src.components.data_transformation import DataTransformation
 from src.components.model_trainer import ModelTrainer
 
+
+# Feature engineering steps, shared by the in-memory and streaming modes
+COLS_TO_CONVERT = ['Levy', 'Mileage', 'Cylinders']
+COLS_TO_DROP = ['ID', 'Doors', 'Wheel']
+# Raw columns parsed from text ('-', '186005 km', '2.0 Turbo'). Read as
+# strings, so a chunk holding only plain numbers parses like the rest.
+RAW_TEXT_DTYPES = {'Levy': str, 'Mileage': str, 'Engine volume': str}
+# Rows outside these (lower, upper) quantiles of each column are dropped. In
+# sequential mode each column's bounds come from the rows kept by the
+# columns before it, in this order.
+OUTLIER_SPEC = {
+    'Mileage': (0.05, 0.95),
+    'Price': (0.05, 0.95),
+    'Engine_volume': (0.05, 0.95),
+    'Levy': (0.05, 0.95),
+}
+OUTLIER_MODES = ('sequential', 'fused')
+COLS_TO_ENCODE = ['Manufacturer', 'Model', 'Category', 'Gear_box_type', 'Fuel_type', 'Color', 'Drive_wheels']
+
+HASH_SPLIT_BUCKETS = 10000
+
+MANUFACTURERS_TO_MODELS_FILE = os.path.join('artifacts', 'manufactures_to_models.json')
+
+
 # Utility functions
-def isInt(x):
-    try:
-        return int(x)
-    except:
-        return None
+def map_unique(column, transform):
+    """
+    Applies the vectorized `transform` to the distinct values of `column` only
+    and broadcasts the results back to every row, missing values staying NaN.
+    Raw feeds repeat a small set of strings, so this is far less work than
+    transforming each row.
+    """
+    codes, uniques = pd.factorize(column)
+    transformed = transform(pd.Series(uniques, dtype=column.dtype)).to_numpy()
+    result = pd.Series(transformed.take(codes), index=column.index)
+    return result.where(codes != -1)
+
+def _parse_int_or_nan(column):
+    if pd.api.types.is_numeric_dtype(column):
+        values = column.astype('float64')
+        return np.trunc(values.where(np.isfinite(values)))
+
+    text = column.str.strip()
+    integer_text = text.str.fullmatch(r'[+-]?\d+', na=False)
+    numbers = pd.to_numeric(text.where(integer_text), errors='coerce').astype('float64')
+
+    # Non-string values mixed into an object column
+    non_text = text.isna() & column.notna()
+    if non_text.any():
+        numbers[non_text] = _parse_int_or_nan(pd.to_numeric(column[non_text], errors='coerce'))
+    return numbers
+
+def to_int_or_nan(column):
+    """
+    Vectorized replacement for applying int() to each value: integer strings and numbers become numbers
+    (floats truncated, as int() does), anything else becomes NaN.
+    """
+    if pd.api.types.is_numeric_dtype(column):
+        return _parse_int_or_nan(column)
+    return map_unique(column, _parse_int_or_nan).astype('float64')
+
+def parse_mileage(column):
+    """
+    Vectorized column.apply(lambda x: x.split()[0]) fused with to_int_or_nan,
+    so raw values like '1200 km' are hashed once and the rows get numbers.
+    """
+    return map_unique(
+        column, lambda mileage: _parse_int_or_nan(mileage.str.extract(r'(\S+)', expand=False))
+    ).astype('float64')
 
 def convert_cols_to_int(df, cols:list):
     for col in cols:
-        df[col] = df[col].apply(isInt)
+        df[col] = to_int_or_nan(df[col])
         if df[col].isna().sum() > 0:
             df[col] = df[col].fillna(df[col].mean())
         df[col] = df[col].astype(int)
@@ -28,59 +96,147 @@ def convert_cols_to_int(df, cols:list):
 def drop_columns(df, cols:list):
     return df.drop(cols, axis=1)
 
-def get_and_remove_outliers(col, df):
-    lower_limit, upper_limit = df[col].quantile([0.05, 0.95])
-    df = df[(df[col] <= upper_limit) & (df[col] >= lower_limit)]
-    return df
+def column_quantiles(values, quantiles, sample_size=None, random_state=42):
+    """
+    Quantiles of a column, estimated from a random sample of `sample_size`
+    rows when the column is larger than that.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if sample_size and len(values) > sample_size:
+        rng = np.random.default_rng(random_state)
+        values = values[rng.integers(0, len(values), sample_size)]
+    return tuple(np.nanquantile(values, quantiles).tolist())
 
-def encoded_cols(df, cols_to_encode:list):
-    for col in cols_to_encode:
-        json_name = col + 's'
-        mean_price = df.groupby(col)['Price'].mean()
-        sorted_col = mean_price.sort_values(ascending=True)
-        col_encoding = {column: value + 1 for value, column in enumerate(sorted_col.index)}
+def outlier_mask(df, bounds):
+    mask = np.ones(len(df), dtype=bool)
+    for col, (lower_limit, upper_limit) in bounds.items():
+        values = df[col].to_numpy()
+        mask &= (values <= upper_limit) & (values >= lower_limit)
+    return mask
+
+def remove_outliers(df, spec=None, mode='sequential', sample_size=None):
+    """
+    Drops the rows outside the quantile bounds of every column in `spec`,
+    copying the DataFrame once.
+
+    'sequential' computes each column's bounds on the rows kept by the
+    columns before it, as if the columns were filtered one at a time.
+    'fused' computes every bound on the full input. `sample_size` estimates
+    the quantiles from a sample for very large inputs.
+    """
+    if mode not in OUTLIER_MODES:
+        raise ValueError(f"Unknown outlier mode {mode!r}, expected one of {OUTLIER_MODES}")
+    spec = OUTLIER_SPEC if spec is None else spec
 
-        col_name = {json_name: col_encoding}
-        json_path = os.path.join('artifacts', f'{col}.json')
-        os.makedirs(os.path.dirname(json_path), exist_ok=True)
+    bounds = {}
+    mask = np.ones(len(df), dtype=bool)
+    for col, quantiles in spec.items():
+        values = df[col].to_numpy()
+        if mode == 'sequential':
+            values = values[mask]
+        bounds[col] = column_quantiles(values, quantiles, sample_size)
+        mask &= outlier_mask(df, {col: bounds[col]})
 
-        with open(json_path, 'w') as file:
-            json.dump(col_name, file, indent=4)
+    logging.info(f'Outlier bounds ({mode}): {bounds}')
+    return df[mask]
 
-        df[col] = df[col].map(col_encoding)
+def encoding_file_path(col):
+    return os.path.join('artifacts', f'{col}.json')
+
+def save_encoding(col, col_encoding):
+    json_name = col + 's'
+    col_name = {json_name: col_encoding}
+    json_path = encoding_file_path(col)
+    os.makedirs(os.path.dirname(json_path), exist_ok=True)
+
+    with open(json_path, 'w') as file:
+        json.dump(col_name, file, indent=4)
+
+def save_manufacturers_to_models(mapped_df):
+    with open(MANUFACTURERS_TO_MODELS_FILE, 'w') as file:
+        json.dump(mapped_df, file, indent=4)
+
+def save_all_encodings(encodings):
+    # One compact artifact, plus the per-column JSONs the server loads
+    save_encodings(encodings)
+    for col, col_encoding in column_encodings(encodings).items():
+        save_encoding(col, col_encoding)
+
+def encoded_cols(df, cols_to_encode:list):
+    encoder = TargetMeanEncoder(cols_to_encode, target='Price')
+    df = encoder.fit_transform(df)
+    save_all_encodings(encoder.encodings)
+    return df
+
+def clean_raw_data(df):
+    df.columns = df.columns.str.replace(' ', '_')
+    df.Mileage = parse_mileage(df.Mileage)
+    df.Engine_volume = df.Engine_volume.str.split(' ').str[0].astype(float)
+    return df
+
+def to_categoricals(df):
+    """Text columns left after encoding (Leather_interior) become categoricals."""
+    for col in df.columns:
+        if pd.api.types.is_object_dtype(df[col]) or pd.api.types.is_string_dtype(df[col]):
+            df[col] = df[col].astype('category')
     return df
 
+def hash_split(ids, test_size):
+    """
+    Deterministic train/test assignment from a hash of each row's ID, so a
+    row lands in the same set whichever chunk it is read in. True means test.
+    """
+    buckets = pd.util.hash_pandas_object(ids, index=False).to_numpy() % HASH_SPLIT_BUCKETS
+    return pd.Series(buckets < round(test_size * HASH_SPLIT_BUCKETS), index=ids.index)
+
 
 # Data ingestion class
 @dataclass
 class DataIngestionConfig:
-    train_data_path: str = os.path.join('artifacts', 'train.csv')
-    test_data_path: str = os.path.join('artifacts', 'test.csv')
-    raw_data_path: str = os.path.join('artifacts', 'data.csv')
+    # Stage outputs. The extension picks the format: .parquet (default) or
+    # .arrow keep dtypes between stages, .csv writes plain text.
+    train_data_path: str = os.path.join('artifacts', 'train.parquet')
+    test_data_path: str = os.path.join('artifacts', 'test.parquet')
+    raw_data_path: str = os.path.join('artifacts', 'data.parquet')
+    # Also write a .csv copy next to each output
+    export_csv: bool = False
+    source_data_path: str = os.path.join('src', 'notebook', 'data', 'car_price_prediction.csv')
+    # Rows read at a time in streaming mode. None reads the whole dataset
+    # into memory and splits it with train_test_split.
+    chunk_size: Optional[int] = None
+    test_size: float = 0.2
+    # 'sequential' or 'fused', see remove_outliers
+    outlier_mode: str = 'sequential'
+    # Estimate in-memory outlier quantiles from this many sampled rows, None
+    # computes them exactly
+    quantile_sample_size: Optional[int] = None
+    # Accuracy of the streaming outlier quantiles, see QuantileSketch
+    sketch_compression: int = 1000
 
 
 class DataIngestion:
-    def __init__(self):
-        self.ingestion_config = DataIngestionConfig()
+    def __init__(self, config=None):
+        self.ingestion_config = config or DataIngestionConfig()
 
     def initiate_data_ingestion(self):
         logging.info('Entered the data ingestion method')
         logging.debug('debug logging is working')
+        if self.ingestion_config.chunk_size:
+            return self.initiate_streaming_ingestion()
+
         try:
             # Read the data as a csv file into df
-            df = pd.read_csv('src/notebook/data/car_price_prediction.csv')
+            df = pd.read_csv(self.ingestion_config.source_data_path, dtype=RAW_TEXT_DTYPES)
             logging.info('Read the datasets as a dataframe')
 
             # Dataframe cleaning
-            df.columns = df.columns.str.replace(' ', '_')
-            df.Mileage = df.Mileage.apply(lambda x: x.split()[0])
-            df.Engine_volume = df.Engine_volume.str.split(' ').str[0].astype(float)
+            df = clean_raw_data(df)
 
             # Feature engineering
             df = self.feature_engineering(df)
+            df = to_categoricals(df)
 
-            os.makedirs(os.path.dirname(self.ingestion_config.raw_data_path), exist_ok=True)
-            df.to_csv(self.ingestion_config.raw_data_path, index=False, header=True)
+            self.save_output(df, self.ingestion_config.raw_data_path)
 
             # Split the data
             return self.split_data(df)
@@ -89,37 +245,179 @@ class DataIngestion:
             raise CustomException(e, sys)
 
     def feature_engineering(self, df):
-        cols_to_convert = ['Levy', 'Mileage', 'Cylinders']
-        convert_cols_to_int(df, cols_to_convert)
+        convert_cols_to_int(df, COLS_TO_CONVERT)
 
-        cols_to_drop = ['ID', 'Doors', 'Wheel']
-        df = drop_columns(df, cols_to_drop)
+        df = drop_columns(df, COLS_TO_DROP)
 
-        df = get_and_remove_outliers('Mileage', df)
-        df = get_and_remove_outliers('Price', df=df)
-        df = get_and_remove_outliers('Engine_volume', df)
-        df = get_and_remove_outliers('Levy', df)
+        df = remove_outliers(
+            df, OUTLIER_SPEC,
+            mode=self.ingestion_config.outlier_mode,
+            sample_size=self.ingestion_config.quantile_sample_size,
+        )
 
         # Map all models to a specific manufacturer
         mapped_df = df.groupby('Manufacturer')['Model'].unique().apply(list).to_dict()
-        with open('artifacts/manufactures_to_models.json', 'w') as file:
-            json.dump(mapped_df, file, indent=4)
+        save_manufacturers_to_models(mapped_df)
 
-        cols_to_encode = ['Manufacturer', 'Model', 'Category', 'Gear_box_type', 'Fuel_type', 'Color', 'Drive_wheels']
-        df = encoded_cols(df, cols_to_encode)
+        df = encoded_cols(df, COLS_TO_ENCODE)
 
         return df
 
     def split_data(self, df):
-        train_set, test_set = train_test_split(df, test_size=0.2, random_state=42)
-        train_set.to_csv(self.ingestion_config.train_data_path, header=True, index=False)
-        test_set.to_csv(self.ingestion_config.test_data_path, header=True, index=False)
+        train_set, test_set = train_test_split(df, test_size=self.ingestion_config.test_size, random_state=42)
+        self.save_output(train_set, self.ingestion_config.train_data_path)
+        self.save_output(test_set, self.ingestion_config.test_data_path)
         logging.info("Ingestion of data completed!")
         return (
             self.ingestion_config.train_data_path,
             self.ingestion_config.test_data_path
         )
 
+    def output_paths(self, file_path):
+        paths = [file_path]
+        if self.ingestion_config.export_csv and frame_format(file_path) != 'csv':
+            paths.append(os.path.splitext(file_path)[0] + '.csv')
+        return paths
+
+    def save_output(self, df, file_path):
+        for path in self.output_paths(file_path):
+            save_frame(df, path)
+
+    def output_files(self):
+        """Every file written by the ingestion, data and JSON artifacts."""
+        config = self.ingestion_config
+        files = []
+        for file_path in [config.raw_data_path, config.train_data_path, config.test_data_path]:
+            files += self.output_paths(file_path)
+        files += [ENCODINGS_FILE, MANUFACTURERS_TO_MODELS_FILE]
+        files += [encoding_file_path(col) for col in COLS_TO_ENCODE]
+        return files
+
+    def initiate_streaming_ingestion(self):
+        """
+        Same feature engineering as the in-memory mode, done over a few passes
+        of `chunk_size` rows so memory use does not grow with the dataset:
+
+        1. column means used to fill unparsable Levy/Mileage/Cylinders values
+        2. QuantileSketches of the outlier columns: in sequential mode one
+           pass per column, fed with the rows that survived the previous
+           columns' bounds, in fused mode a single pass for all of them
+        3. TargetMeanEncoder fitted chunk by chunk, and the manufacturer to
+           models mapping
+        4. encoding and writing the data, train and test outputs chunk by
+           chunk, split by a hash of the row ID
+
+        Outlier bounds are estimates, so a handful of rows right at a bound can
+        be kept or dropped differently from the in-memory mode.
+        """
+        try:
+            fill_values = self._streaming_fill_values()
+            logging.info(f'Streaming fill values: {fill_values}')
+
+            bounds = self._streaming_outlier_bounds(fill_values)
+            logging.info(f'Streaming outlier bounds: {bounds}')
+
+            encoder = self._streaming_encoder(fill_values, bounds)
+            self._write_streaming_outputs(fill_values, bounds, encoder)
+
+            logging.info("Streaming ingestion of data completed!")
+            return (
+                self.ingestion_config.train_data_path,
+                self.ingestion_config.test_data_path
+            )
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def _raw_chunks(self):
+        chunks = pd.read_csv(
+            self.ingestion_config.source_data_path, dtype=RAW_TEXT_DTYPES, chunksize=self.ingestion_config.chunk_size
+        )
+        for chunk in chunks:
+            yield clean_raw_data(chunk)
+
+    def _streaming_fill_values(self):
+        sums = dict.fromkeys(COLS_TO_CONVERT, 0.0)
+        counts = dict.fromkeys(COLS_TO_CONVERT, 0)
+        for chunk in self._raw_chunks():
+            for col in COLS_TO_CONVERT:
+                values = to_int_or_nan(chunk[col])
+                sums[col] += values.sum()
+                counts[col] += values.count()
+        return {col: sums[col] / counts[col] if counts[col] else np.nan for col in COLS_TO_CONVERT}
+
+    def _streaming_outlier_bounds(self, fill_values):
+        mode = self.ingestion_config.outlier_mode
+        if mode not in OUTLIER_MODES:
+            raise ValueError(f"Unknown outlier mode {mode!r}, expected one of {OUTLIER_MODES}")
+
+        if mode == 'sequential':
+            passes = [[col] for col in OUTLIER_SPEC]
+        else:
+            passes = [list(OUTLIER_SPEC)]
+
+        bounds = {}
+        for cols in passes:
+            sketches = {col: QuantileSketch(self.ingestion_config.sketch_compression) for col in cols}
+            for chunk in self._engineered_chunks(fill_values, bounds):
+                for col, sketch in sketches.items():
+                    sketch.update(chunk[col].to_numpy())
+            for col, sketch in sketches.items():
+                bounds[col] = tuple(sketch.quantile(OUTLIER_SPEC[col]))
+        return bounds
+
+    def _engineered_chunks(self, fill_values, bounds):
+        """
+        Raw chunks with the integer columns converted and the outlier `bounds`
+        known so far applied. The ID column is kept for the split.
+        """
+        for chunk in self._raw_chunks():
+            for col in COLS_TO_CONVERT:
+                chunk[col] = to_int_or_nan(chunk[col]).fillna(fill_values[col]).astype(int)
+
+            yield chunk[outlier_mask(chunk, bounds)]
+
+    def _streaming_encoder(self, fill_values, bounds):
+        encoder = TargetMeanEncoder(COLS_TO_ENCODE, target='Price')
+        manufacturers_to_models = {}
+        for chunk in self._engineered_chunks(fill_values, bounds):
+            encoder.partial_fit(chunk)
+
+            for manufacturer, model in chunk[['Manufacturer', 'Model']].drop_duplicates().itertuples(index=False):
+                manufacturers_to_models.setdefault(manufacturer, {})[model] = None
+
+        save_manufacturers_to_models({
+            manufacturer: list(manufacturers_to_models[manufacturer])
+            for manufacturer in sorted(manufacturers_to_models)
+        })
+
+        save_all_encodings(encoder.finalize())
+        return encoder
+
+    def _write_streaming_outputs(self, fill_values, bounds, encoder):
+        writers = {
+            name: [FrameWriter(path) for path in self.output_paths(file_path)]
+            for name, file_path in [
+                ('data', self.ingestion_config.raw_data_path),
+                ('train', self.ingestion_config.train_data_path),
+                ('test', self.ingestion_config.test_data_path),
+            ]
+        }
+        try:
+            for chunk in self._engineered_chunks(fill_values, bounds):
+                is_test = hash_split(chunk['ID'], self.ingestion_config.test_size)
+                chunk = encoder.transform(drop_columns(chunk, COLS_TO_DROP))
+                chunk = to_categoricals(chunk)
+
+                rows = {'data': chunk, 'train': chunk[~is_test], 'test': chunk[is_test]}
+                for name, frame_writers in writers.items():
+                    for writer in frame_writers:
+                        writer.write(rows[name])
+        finally:
+            for frame_writers in writers.values():
+                for writer in frame_writers:
+                    writer.close()
+
 
 if __name__ == '__main__':
     obj = DataIngestion()
@@ -10,15 +10,17 @@ from sklearn.preprocessing import StandardScaler, LabelEncoder
 
 from src.exception import CustomException
 from src.logger import logging
+from src.frames import load_frame
 from src.utils import save_object
 
 @dataclass
 class DataTransformationConfig:
     preprocessor_obj_file_path: str = os.path.join('artifacts', 'preprocessor.pkl')
+    mileage_scaler_file_path: str = os.path.join('artifacts', 'mileage_scaler.pkl')
 
 class DataTransformation:
-    def __init__(self):
-        self.data_transformation_config = DataTransformationConfig()
+    def __init__(self, config=None):
+        self.data_transformation_config = config or DataTransformationConfig()
 
     def get_data_transformer_object(self):
         """
@@ -39,9 +41,9 @@ class DataTransformation:
         and saves the preprocessor object.
         """
         try:
-            # Load datasets
-            train_df = pd.read_csv(train_path)
-            test_df = pd.read_csv(test_path)
+            # Load datasets, Parquet/Arrow outputs come back with their dtypes
+            train_df = load_frame(train_path)
+            test_df = load_frame(test_path)
 
             logging.info("Reading train and test data completed.")
 
@@ -49,12 +51,14 @@ class DataTransformation:
             mileage_scaler, le = self.get_data_transformer_object()
 
             # Apply transformations on train and test data
-            train_df['Mileage'] = pd.to_numeric(train_df['Mileage'], errors='coerce')
-            test_df['Mileage'] = pd.to_numeric(test_df['Mileage'], errors='coerce')
+            if not pd.api.types.is_numeric_dtype(train_df['Mileage']):
+                train_df['Mileage'] = pd.to_numeric(train_df['Mileage'], errors='coerce')
+            if not pd.api.types.is_numeric_dtype(test_df['Mileage']):
+                test_df['Mileage'] = pd.to_numeric(test_df['Mileage'], errors='coerce')
 
             scaled_train_mileage = mileage_scaler.fit_transform(train_df[['Mileage']])
             train_df['Mileage'] = scaled_train_mileage
-            joblib.dump(mileage_scaler, 'artifacts/mileage_scaler.pkl')
+            joblib.dump(mileage_scaler, self.data_transformation_config.mileage_scaler_file_path)
             scaled_test_mileage = mileage_scaler.transform(test_df[['Mileage']])
             test_df['Mileage'] = scaled_test_mileage
 
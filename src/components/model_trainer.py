@@ -19,16 +19,30 @@ from src.exception import CustomException
 from src.logger import logging
 
 from src.utils import save_object, evaluate_models, train_test_cross_validate
+from src.forest import is_tree_ensemble, export_forest
 
 
 @dataclass
 class ModelTrainerConfig:
     trained_model_file_path: str = os.path.join("artifacts", "model.pkl")
+    trained_forest_dir: str = os.path.join("artifacts", "model_forest")
+    columns_file_path: str = os.path.join("artifacts", "columns.json")
+    # Core budget for the model search (-1 = all cores) and the backend
+    # running the models side by side ('loky' or 'threading')
+    n_jobs: int = -1
+    parallel_backend: str = "loky"
+    # Hyperparameter search: "grid" (exhaustive) or "halving" (successive
+    # halving over the wider grids in each model's "halving" entry)
+    search_strategy: str = "grid"
+    # Opt-in diagnostics: a separate k-fold cross-validation of the best model,
+    # costing cv_folds extra fits on top of the search
+    run_cv_diagnostics: bool = False
+    cv_folds: int = 10
 
 
 class ModelTrainer:
-    def __init__(self):
-        self.model_trainer_config = ModelTrainerConfig()
+    def __init__(self, config=None):
+        self.model_trainer_config = config or ModelTrainerConfig()
 
     def initiate_model_trainer(self, train_array, test_array):
         try:
@@ -44,7 +58,7 @@ class ModelTrainer:
             X_test, y_test = test_array.iloc[:, 1:], test_array.iloc[:, 0]
 
             columns = {'data_columns': [cols for cols in X_train.columns]}
-            with open('artifacts/columns.json', 'w') as file:
+            with open(self.model_trainer_config.columns_file_path, 'w') as file:
                 json.dump(columns, file, indent=4)
 
             model_params = {
@@ -59,12 +73,31 @@ class ModelTrainer:
                     'params': {
                         'max_depth': [150],
                         'n_estimators': [50, 100],
+                    },
+                    'halving': {
+                        'params': {
+                            'max_depth': [20, 50, 150],
+                            'min_samples_leaf': [1, 2, 4],
+                            'max_features': [1.0, 0.5],
+                        },
+                        'resource': 'n_estimators',
+                        'min_resources': 25,
+                        'max_resources': 200,
                     }
                 },
                 'xgb_regressor': {
                     'model': XGBRegressor(objective='reg:squarederror', enable_categorical=True),
                     'params': {
                         'n_estimators': [150, 200]
+                    },
+                    'halving': {
+                        'params': {
+                            'n_estimators': [1000],
+                            'max_depth': [4, 6, 8, 10],
+                            'learning_rate': [0.03, 0.1, 0.3],
+                            'min_child_weight': [1, 5],
+                        },
+                        'early_stopping_rounds': 20,
                     }
                 },
                 # 'catboost_regressor': {
@@ -82,10 +115,16 @@ class ModelTrainer:
                 'y_train': y_train,
                 'X_test': X_test,
                 'y_test': y_test,
-                'cv': 10
+                'cv': self.model_trainer_config.cv_folds
             }
 
-            model_report: dict = evaluate_models(X_train, y_train, model_params)
+            model_report, best_estimators = evaluate_models(
+                X_train, y_train, model_params,
+                n_jobs=self.model_trainer_config.n_jobs,
+                backend=self.model_trainer_config.parallel_backend,
+                strategy=self.model_trainer_config.search_strategy,
+                return_estimators=True
+            )
             
             logging.info(f"Model evaluation report: {model_report}")
 
@@ -96,22 +135,36 @@ class ModelTrainer:
 
             logging.info(f"Best model found: {best_model} with parameters: {best_model_params}")
 
-            # Re-instantiate the best model with the best found parameters
-            best_model_instance = model_params[best_model['model_name']]['model'].set_params(**best_model_params)
-            
-            # Fit the model on the training data
-            best_model_instance.fit(X_train, y_train)
+            # The search already refit the best model on the training data
+            search_result = best_estimators[best_model['model_name']]
+            best_model_instance = search_result['best_estimator']
+            logging.info(f"Search CV scores of the best model: {search_result['cv_scores']}")
+
+            if best_model_instance is None:
+                # Re-instantiate the best model with the best found parameters
+                best_model_instance = model_params[best_model['model_name']]['model'].set_params(**best_model_params)
+
+                # Fit the model on the training data
+                best_model_instance.fit(X_train, y_train)
 
             save_object(
                 file_path=self.model_trainer_config.trained_model_file_path,
                 obj=best_model_instance
             )
 
-            # Train and cross-validate the best model
-            logging.info(f"Training and cross-validating the best model: {best_model}")
-            trained_model = train_test_cross_validate(best_model_instance, **additional_params)
-
-            logging.info(f"Best model trained: {trained_model}")
+            # Memory-mappable copy of the trees, shared by all server workers
+            if is_tree_ensemble(best_model_instance):
+                export_forest(
+                    best_model_instance,
+                    self.model_trainer_config.trained_forest_dir,
+                    source_path=self.model_trainer_config.trained_model_file_path,
+                    X_check=X_test
+                )
+
+            if self.model_trainer_config.run_cv_diagnostics:
+                # Cross-validate the best model, on clones, without refitting it
+                logging.info(f"Cross-validating the best model: {best_model}")
+                train_test_cross_validate(best_model_instance, refit=False, **additional_params)
 
             # Predictions and performance evaluation
             predicted = best_model_instance.predict(X_test)
@@ -0,0 +1,117 @@
+import os
+import sys
+import json
+
+import numpy as np
+import pandas as pd
+
+from src.exception import CustomException
+
+
+ENCODINGS_FILE = os.path.join('artifacts', 'encodings.json')
+
+
+def column_encodings(encodings):
+    """
+    Per-column {category: code} dictionaries, as stored in artifacts/{col}.json,
+    from the compact {col: [categories by ascending mean]} artifact.
+    """
+    return {
+        col: {category: code + 1 for code, category in enumerate(categories)}
+        for col, categories in encodings.items()
+    }
+
+
+def save_encodings(encodings, file_path=ENCODINGS_FILE):
+    try:
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, 'w') as file:
+            json.dump(encodings, file, separators=(',', ':'))
+
+    except Exception as e:
+        raise CustomException(e, sys)
+
+
+class TargetMeanEncoder:
+    """
+    Encodes several categorical columns at once by ranking each column's
+    categories by their mean target (1 = cheapest).
+
+    Columns are converted to categoricals once. The target sums and counts
+    of every column come from a single np.bincount over the category codes,
+    offset so each column gets its own range of bins. Encoding is then a
+    lookup of the codes. partial_fit can be called chunk by chunk.
+    """
+    def __init__(self, cols:list, target='Price'):
+        self.cols = cols
+        self.target = target
+        self._sums = {}
+        self._counts = {}
+        self.encodings = None
+        self._ranks = None
+
+    def _categoricals(self, df, categories=None):
+        if categories is None:
+            return {col: pd.Categorical(df[col]) for col in self.cols}
+        return {col: pd.Categorical(df[col], categories=categories[col]) for col in self.cols}
+
+    def partial_fit(self, df, categoricals=None):
+        categoricals = categoricals or self._categoricals(df)
+        sizes = [len(categoricals[col].categories) for col in self.cols]
+        offsets = np.concatenate([[0], np.cumsum(sizes)])
+
+        codes = np.concatenate([categoricals[col].codes + offset for col, offset in zip(self.cols, offsets)])
+        valid = np.concatenate([categoricals[col].codes >= 0 for col in self.cols])
+        target = np.tile(df[self.target].to_numpy(dtype=np.float64), len(self.cols))
+
+        sums = np.bincount(codes[valid], weights=target[valid], minlength=offsets[-1])
+        counts = np.bincount(codes[valid], minlength=offsets[-1])
+
+        for col, start, end in zip(self.cols, offsets[:-1], offsets[1:]):
+            index = categoricals[col].categories
+            col_sums = pd.Series(sums[start:end], index=index)
+            col_counts = pd.Series(counts[start:end], index=index)
+            if col in self._sums:
+                col_sums = self._sums[col].add(col_sums, fill_value=0)
+                col_counts = self._counts[col].add(col_counts, fill_value=0)
+            self._sums[col], self._counts[col] = col_sums, col_counts
+
+        self.encodings = None
+        return self
+
+    def finalize(self):
+        """Ranks the categories seen so far and returns the compact encodings."""
+        encodings, ranks = {}, {}
+        for col in self.cols:
+            seen = self._counts[col] > 0
+            mean_target = (self._sums[col][seen] / self._counts[col][seen]).sort_index()
+            order = np.argsort(mean_target.to_numpy(), kind='quicksort')
+            categories = mean_target.index[order]
+
+            encodings[col] = categories.tolist()
+            ranks[col] = pd.Series(np.arange(1, len(categories) + 1), index=categories)
+        self.encodings, self._ranks = encodings, ranks
+        return encodings
+
+    def transform(self, df, categoricals=None):
+        if self.encodings is None:
+            self.finalize()
+        categoricals = categoricals or self._categoricals(
+            df, {col: ranks.index.sort_values() for col, ranks in self._ranks.items()}
+        )
+        for col in self.cols:
+            categorical = categoricals[col]
+            ranks = self._ranks[col].reindex(categorical.categories).to_numpy()
+            codes = categorical.codes
+            if (codes < 0).any():
+                encoded = np.where(codes >= 0, ranks[codes].astype(np.float64), np.nan)
+            else:
+                encoded = ranks[codes]
+            df[col] = pd.Series(encoded, index=df.index)
+        return df
+
+    def fit_transform(self, df):
+        categoricals = self._categoricals(df)
+        self.partial_fit(df, categoricals)
+        self.finalize()
+        return self.transform(df, categoricals)
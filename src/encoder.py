@@ -0,0 +1,208 @@
+import os
+import re
+import sys
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from src.exception import CustomException
+from src.utils import load_json_object, compute_fallback
+
+
+# Request field -> data column, for values passed through as numbers
+NUMERIC_FIELDS = {
+    'levy': 'Levy',
+    'prod_year': 'Prod._year',
+    'engine_volume': 'Engine_volume',
+    'cylinder': 'Cylinders',
+    'airbag': 'Airbags',
+}
+
+# Request field -> (data column, category JSON file, dict name)
+CATEGORY_FIELDS = {
+    'manufacturer': ('Manufacturer', 'Manufacturer.json', 'Manufacturers'),
+    'model': ('Model', 'Model.json', 'Models'),
+    'category': ('Category', 'Category.json', 'Categorys'),
+    'fuel_type': ('Fuel_type', 'Fuel_type.json', 'Fuel_types'),
+    'gear_box_type': ('Gear_box_type', 'Gear_box_type.json', 'Gear_box_types'),
+    'drive_wheel': ('Drive_wheels', 'Drive_wheels.json', 'Drive_wheelss'),
+    'color': ('Color', 'Color.json', 'Colors'),
+}
+
+INTERIOR_FIELD, INTERIOR_COLUMN = 'interior', 'Leather_interior'
+MILEAGE_FIELD, MILEAGE_COLUMN = 'mileage', 'Mileage'
+
+
+# Runs of whitespace, punctuation and underscores
+_SEPARATORS = re.compile(r'[\W_]+')
+
+
+def normalize_category(value):
+    """Casefolded, with whitespace and punctuation collapsed: 'B-MAX ' -> 'b max'."""
+    return _SEPARATORS.sub(' ', value.casefold()).strip()
+
+
+class CategoryIndex:
+    """
+    Case- and punctuation-insensitive lookup of category keys, built once
+    per dictionary.
+
+    Keys are indexed by their normalized form. When several keys share one
+    ('Golf Gti', 'Golf GTI'), the title-cased key wins, as it is the one
+    exact title-case lookups used to hit. The keys' own, upper, lower and
+    title-case spellings are also indexed directly, so common inputs resolve
+    with a single dict probe and only other spellings get normalized.
+    """
+    def __init__(self, lookup):
+        keys = [key for key in lookup if isinstance(key, str)]
+        self.values = {}
+        for key in sorted(keys, key=lambda key: key != key.title()):
+            self.values.setdefault(normalize_category(key), lookup[key])
+
+        self._spellings = {}
+        for key in keys:
+            for spelling in (key, key.upper(), key.lower(), key.title()):
+                self._spellings[spelling] = self.values[normalize_category(spelling)]
+
+    def __len__(self):
+        return len(self.values)
+
+    def resolve(self, value, default=None):
+        """Value of the key `value` normalizes to, `default` if none does."""
+        try:
+            return self._spellings[value]
+        except (KeyError, TypeError):
+            pass
+        if isinstance(value, str):
+            return self.values.get(normalize_category(value), default)
+        return default
+
+    def resolve_column(self, column, default=np.nan):
+        """
+        Resolves a whole pd.Series, each distinct value once. Missing values
+        stay NaN.
+        """
+        codes, uniques = pd.factorize(column)
+        resolved = np.array([self.resolve(value, default) for value in uniques] + [np.nan], dtype=np.float64)
+        return pd.Series(resolved[codes], index=column.index)
+
+
+def is_missing(value):
+    """True for None and float NaN, which encode like an absent field."""
+    return value is None or (isinstance(value, float) and value != value)
+
+
+class FeatureEncoder:
+    """
+    Turns request fields (levy, manufacturer, mileage, ...) into the model's
+    feature vector. Column positions, category lookups and fallback values are
+    resolved once at construction so encoding is a table lookup per field.
+
+    Category values are resolved through a CategoryIndex, ignoring case and
+    punctuation. Unknown categories encode as the dictionary's fallback value,
+    computed once from `fallback`: a number, or 'mean' / 'median' of the
+    dictionary's codes. Missing fields, and fields set to None or NaN,
+    encode as 0, in encode and encode_batch alike.
+    """
+    def __init__(self, data_columns, category_dicts, mileage_scaler, fallback=0):
+        try:
+            self.data_columns = list(data_columns)
+            self.n_features = len(self.data_columns)
+            self.mileage_scaler = mileage_scaler
+            self.fallback = fallback
+
+            column_index = {column: idx for idx, column in enumerate(self.data_columns)}
+
+            self._numeric = {field: column_index[column] for field, column in NUMERIC_FIELDS.items()}
+            self._categorical = {}
+            for field, (column, _, _) in CATEGORY_FIELDS.items():
+                lookup = dict(category_dicts[field])
+                self._categorical[field] = (column_index[column], CategoryIndex(lookup), compute_fallback(lookup, fallback))
+            self._categorical[INTERIOR_FIELD] = (column_index[INTERIOR_COLUMN], CategoryIndex({'Leather': 1}), 0)
+            self._mileage_index = column_index[MILEAGE_COLUMN]
+
+            # StandardScaler.transform as a plain affine map, (x - mean_) / scale_
+            mean, scale = mileage_scaler.mean_, mileage_scaler.scale_
+            self._mileage_mean = float(mean[0]) if mean is not None else 0.0
+            self._mileage_scale = float(scale[0]) if scale is not None else 1.0
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    @classmethod
+    def from_artifacts(cls, artifacts_dir='artifacts', mileage_scaler=None, fallback=0):
+        """Builds an encoder from columns.json, the category JSONs and the mileage scaler."""
+        data_columns = load_json_object(os.path.join(artifacts_dir, 'columns.json'))['data_columns']
+        category_dicts = {
+            field: load_json_object(os.path.join(artifacts_dir, file_name))[dict_name]
+            for field, (_, file_name, dict_name) in CATEGORY_FIELDS.items()
+        }
+        if mileage_scaler is None:
+            mileage_scaler = joblib.load(os.path.join(artifacts_dir, 'mileage_scaler.pkl'))
+        return cls(data_columns, category_dicts, mileage_scaler, fallback=fallback)
+
+    def scale_mileage(self, mileage):
+        return (np.asarray(mileage, dtype=np.float64) - self._mileage_mean) / self._mileage_scale
+
+    def bind_model(self, model):
+        """
+        Checks once that `model` was fitted on data_columns in this order, then
+        drops its stored feature names so it can be fed the encoded arrays
+        directly instead of a DataFrame on every call.
+        """
+        feature_names = getattr(model, 'feature_names_in_', None)
+        if feature_names is not None:
+            if list(feature_names) != self.data_columns:
+                raise ValueError(
+                    f"Model was fitted on columns {list(feature_names)}, expected {self.data_columns}"
+                )
+            del model.feature_names_in_
+        return model
+
+    def encode(self, record):
+        """
+        Encodes one car dict into a float32 vector of length n_features,
+        without going through pandas.
+        """
+        x = np.zeros(self.n_features, dtype=np.float32)
+
+        for key, value in record.items():
+            if is_missing(value):
+                continue
+
+            if key in self._categorical:
+                idx, index, fallback = self._categorical[key]
+                x[idx] = index.resolve(value, fallback)
+
+            elif key in self._numeric:
+                x[self._numeric[key]] = value
+
+            elif key == MILEAGE_FIELD:
+                x[self._mileage_index] = (float(value) - self._mileage_mean) / self._mileage_scale
+
+        return x
+
+    def encode_batch(self, records):
+        """
+        Encodes a list of car dicts into a float32 matrix of shape
+        (len(records), n_features), one vectorized pass per column.
+        """
+        frame = pd.DataFrame.from_records(records)
+        x = np.zeros((len(frame), self.n_features), dtype=np.float32)
+
+        for field, idx in self._numeric.items():
+            if field in frame:
+                x[:, idx] = pd.to_numeric(frame[field]).fillna(0)
+
+        for field, (idx, index, fallback) in self._categorical.items():
+            if field in frame:
+                x[:, idx] = index.resolve_column(frame[field], fallback).fillna(0)
+
+        if MILEAGE_FIELD in frame:
+            mileage = pd.to_numeric(frame[MILEAGE_FIELD])
+            known = mileage.notna().to_numpy()
+            if known.any():
+                x[known, self._mileage_index] = self.scale_mileage(mileage[known])
+
+        return x
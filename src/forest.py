@@ -0,0 +1,471 @@
+import os
+import sys
+import copy
+import json
+import hashlib
+from functools import cached_property
+
+import joblib
+import numpy as np
+from sklearn.ensemble import ExtraTreesRegressor, RandomForestRegressor
+from sklearn.linear_model import ElasticNet, Lasso, LinearRegression, Ridge
+
+from src.exception import CustomException
+from src.logger import logging
+from src.frames import load_frame
+
+
+FOREST_ARRAYS = ('feature', 'threshold', 'left', 'right', 'missing_left', 'value', 'roots')
+FOREST_META_FILE = 'meta.json'
+
+# Child index of a leaf, same as sklearn's TREE_LEAF
+LEAF = -1
+
+# Models predicting X @ coef_ + intercept_
+LINEAR_MODELS = (LinearRegression, Ridge, Lasso, ElasticNet)
+
+
+# Engines score at most this many rows one at a time with plain Python
+# loops, which beats a NumPy call per tree level for tiny batches
+SCALAR_MAX_ROWS = 8
+# Above this many rows, an engine holding the original sklearn model hands
+# the batch to it, as its compiled traversal wins on large batches
+REFERENCE_MIN_ROWS = 128
+
+
+def is_tree_ensemble(model):
+    """True for fitted forests whose prediction is the mean of their trees."""
+    if not isinstance(model, (RandomForestRegressor, ExtraTreesRegressor)):
+        return False
+    estimators = getattr(model, 'estimators_', None)
+    return estimators is not None and all(hasattr(estimator, 'tree_') for estimator in estimators)
+
+
+def is_xgboost_model(model):
+    return hasattr(model, 'get_booster')
+
+
+def is_linear_model(model):
+    return isinstance(model, LINEAR_MODELS) and hasattr(model, 'coef_') and np.ndim(model.coef_) == 1
+
+
+def file_fingerprint(file_path):
+    """Size and modification time of a file, None when it does not exist."""
+    try:
+        stat = os.stat(file_path)
+        return [stat.st_size, stat.st_mtime_ns]
+    except FileNotFoundError:
+        return None
+
+
+def file_hash(file_path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def walk_leaves(X, roots, feature, left, right, go_left):
+    """
+    Leaf node reached by every row of X in each tree starting at `roots`,
+    as a flat (n_rows * n_trees) array in row-major order. `go_left(values,
+    node)` is the split test: the rows' values of each node's feature ->
+    whether they go to its left child.
+
+    Walks every (row, tree) pair at once, one tree level per step, and
+    drops the pairs that reached a leaf.
+    """
+    n_rows, n_features = X.shape
+    node = np.tile(roots, n_rows)
+    pair = np.arange(len(node))
+    offset = np.repeat(np.arange(n_rows, dtype=np.intp) * n_features, len(roots))
+    leaf = np.empty(len(node), dtype=np.intp)
+    x = X.ravel()
+
+    while len(node):
+        children = left[node]
+        done = children == LEAF
+        if done.any():
+            leaf[pair[done]] = node[done]
+            active = ~done
+            node, pair, offset, children = node[active], pair[active], offset[active], children[active]
+        node = np.where(go_left(x[offset + feature[node]], node), children, right[node])
+
+    return leaf
+
+
+class FlatForest:
+    """
+    A fitted sklearn tree ensemble (e.g. RandomForestRegressor) flattened into
+    contiguous node arrays: one entry per node across all trees, with child
+    indices pointing into the same arrays.
+
+    Saved as plain .npy files, the arrays can be memory-mapped read-only so
+    every worker process on a host shares one page-cache copy of the trees,
+    where unpickling model.pkl gives each worker its own copy.
+
+    predict() skips sklearn's per-call input validation and joblib dispatch,
+    which dominate single-car latency, and returns bit-for-bit the same
+    values. `reference` is the sklearn model when it is loaded anyway, so
+    large batches can use its compiled traversal.
+    """
+    def __init__(self, feature, threshold, left, right, missing_left, value, roots, max_depth, feature_names=None, reference=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        # Where NaN goes at each split, as sklearn learned it
+        self.missing_left = missing_left
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.n_estimators = len(roots)
+        self.reference = reference
+        if feature_names is not None:
+            self.feature_names_in_ = np.asarray(feature_names, dtype=object)
+
+    @classmethod
+    def from_model(cls, model, keep_reference=False):
+        if not is_tree_ensemble(model):
+            raise TypeError(f"Cannot flatten {type(model).__name__}, expected a fitted tree ensemble")
+
+        feature, threshold, left, right, missing_left, value, roots = [], [], [], [], [], [], []
+        offset, max_depth = 0, 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            is_leaf = tree.children_left == LEAF
+
+            roots.append(offset)
+            # Leaves get feature 0 so gathering X[:, feature] never goes out of range
+            feature.append(np.where(is_leaf, 0, tree.feature))
+            threshold.append(tree.threshold)
+            left.append(np.where(is_leaf, LEAF, tree.children_left + offset))
+            right.append(np.where(is_leaf, LEAF, tree.children_right + offset))
+            # sklearn before 1.3 has no missing-value support, NaN went right
+            missing_left.append(getattr(tree, 'missing_go_to_left', np.zeros(tree.node_count)))
+            value.append(tree.value[:, 0, 0])
+
+            offset += tree.node_count
+            max_depth = max(max_depth, tree.max_depth)
+
+        return cls(
+            feature=np.concatenate(feature).astype(np.int32),
+            threshold=np.concatenate(threshold).astype(np.float64),
+            left=np.concatenate(left).astype(np.int32),
+            right=np.concatenate(right).astype(np.int32),
+            missing_left=np.concatenate(missing_left).astype(bool),
+            value=np.concatenate(value).astype(np.float64),
+            roots=np.asarray(roots, dtype=np.int32),
+            max_depth=max_depth,
+            feature_names=getattr(model, 'feature_names_in_', None),
+            reference=cls._reference(model) if keep_reference else None,
+        )
+
+    @staticmethod
+    def _reference(model):
+        # Shallow copy sharing the fitted trees, without feature names so it
+        # can be fed arrays without a warning on every call
+        reference = copy.copy(model)
+        reference.__dict__.pop('feature_names_in_', None)
+        return reference
+
+    def save(self, forest_dir, source_path=None):
+        """
+        Writes one .npy file per node array plus a meta.json. `source_path` is
+        the pickled model the arrays were exported from, recorded so a stale
+        export can be detected later.
+        """
+        try:
+            os.makedirs(forest_dir, exist_ok=True)
+            for name in FOREST_ARRAYS:
+                np.save(os.path.join(forest_dir, f'{name}.npy'), getattr(self, name))
+
+            feature_names = getattr(self, 'feature_names_in_', None)
+            meta = {
+                'max_depth': self.max_depth,
+                'feature_names': None if feature_names is None else list(feature_names),
+                'source': file_fingerprint(source_path) if source_path else None,
+                # Survives deploys that do not preserve modification times
+                'source_sha256': file_hash(source_path) if source_path else None,
+            }
+            with open(os.path.join(forest_dir, FOREST_META_FILE), 'w') as file:
+                json.dump(meta, file, indent=4)
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    @classmethod
+    def load(cls, forest_dir, mmap_mode='r'):
+        try:
+            with open(os.path.join(forest_dir, FOREST_META_FILE), 'r') as file:
+                meta = json.load(file)
+            arrays = {
+                name: np.load(os.path.join(forest_dir, f'{name}.npy'), mmap_mode=mmap_mode)
+                for name in FOREST_ARRAYS
+            }
+            return cls(**arrays, max_depth=meta['max_depth'], feature_names=meta['feature_names'])
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def predict(self, X):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if len(X) <= SCALAR_MAX_ROWS:
+            return np.array([self._predict_row(row) for row in X.tolist()], dtype=np.float64)
+        if self.reference is not None and len(X) >= REFERENCE_MIN_ROWS:
+            return self.reference.predict(X)
+        return self.combine(self.leaf_values(X))
+
+    @cached_property
+    def _nodes(self):
+        # memoryviews index about as fast as lists, without copying the arrays
+        return tuple(memoryview(np.ascontiguousarray(getattr(self, name))) for name in FOREST_ARRAYS)
+
+    def _predict_row(self, x):
+        """
+        One row, tree by tree. `x` holds the float32 features as Python
+        floats, compared against the float64 thresholds as sklearn does.
+        Rows with NaN take the slower walk checking each split's value.
+        """
+        feature, threshold, left, right, missing_left, value, roots = self._nodes
+        has_nan = any(feature_value != feature_value for feature_value in x)
+        total = 0.0
+        for node in roots:
+            child = left[node]
+            while child != LEAF:
+                split_value = x[feature[node]]
+                if has_nan and split_value != split_value:
+                    node = child if missing_left[node] else right[node]
+                else:
+                    node = child if split_value <= threshold[node] else right[node]
+                child = left[node]
+            total += value[node]
+        return total / self.n_estimators
+
+    def leaf_values(self, X, trees=slice(None)):
+        """
+        Leaf value reached by every row in each tree of `trees` (a slice of
+        the estimators), as an (n_rows, n_trees) array.
+
+        Walks every (row, tree) pair at once, see walk_leaves.
+        """
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        roots = np.asarray(self.roots[trees], dtype=np.intp)
+        if np.isnan(X).any():
+            go_left = lambda values, node: np.where(np.isnan(values), self.missing_left[node], values <= self.threshold[node])
+        else:
+            go_left = lambda values, node: values <= self.threshold[node]
+        leaf = walk_leaves(X, roots, self.feature, self.left, self.right, go_left)
+        return self.value[leaf].reshape(len(X), len(roots))
+
+    def combine(self, leaf_values):
+        """Averages the trees' outputs in estimator order, as sklearn does."""
+        predictions = np.zeros(len(leaf_values), dtype=np.float64)
+        for tree in range(leaf_values.shape[1]):
+            predictions += leaf_values[:, tree]
+        predictions /= self.n_estimators
+        return predictions
+
+
+class FlatBoostedTrees:
+    """
+    A fitted XGBoost regressor flattened into the same kind of node arrays,
+    scored the way XGBoost does: float32 splits where `x < threshold` goes
+    left and missing values follow the node's default direction, and leaf
+    values summed in float32 on top of base_score, in tree order.
+    """
+    def __init__(self, feature, threshold, left, right, default_left, value, roots, base_score, feature_names=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.default_left = default_left
+        self.value = value
+        self.roots = roots
+        self.base_score = np.float32(base_score)
+        self.n_estimators = len(roots)
+        if feature_names is not None:
+            self.feature_names_in_ = np.asarray(feature_names, dtype=object)
+
+    @classmethod
+    def from_model(cls, model):
+        booster = model.get_booster()
+        learner = json.loads(booster.save_raw('json'))['learner']
+        if learner['objective']['name'] != 'reg:squarederror':
+            raise TypeError(f"Cannot flatten XGBoost objective {learner['objective']['name']}")
+        if learner['gradient_booster']['name'] != 'gbtree':
+            raise TypeError(f"Cannot flatten XGBoost booster {learner['gradient_booster']['name']}")
+
+        gbtree = learner['gradient_booster']['model']
+        trees = gbtree['trees']
+        try:
+            # predict() stops at the best iteration of early-stopped models
+            trees_per_round = int(gbtree['gbtree_model_param']['num_parallel_tree'])
+            trees = trees[:(model.best_iteration + 1) * trees_per_round]
+        except AttributeError:
+            pass
+
+        feature, threshold, left, right, default_left, roots = [], [], [], [], [], []
+        offset = 0
+        for tree in trees:
+            if any(tree['split_type']):
+                raise TypeError("Cannot flatten XGBoost trees with categorical splits")
+            children_left = np.asarray(tree['left_children'])
+            is_leaf = children_left == LEAF
+
+            roots.append(offset)
+            feature.append(np.where(is_leaf, 0, tree['split_indices']))
+            # A leaf's split condition holds its value
+            threshold.append(np.asarray(tree['split_conditions'], dtype=np.float32))
+            left.append(np.where(is_leaf, LEAF, children_left + offset))
+            right.append(np.where(is_leaf, LEAF, np.asarray(tree['right_children']) + offset))
+            default_left.append(np.asarray(tree['default_left'], dtype=bool))
+            offset += len(children_left)
+
+        threshold = np.concatenate(threshold)
+        return cls(
+            feature=np.concatenate(feature).astype(np.int32),
+            threshold=threshold,
+            left=np.concatenate(left).astype(np.int32),
+            right=np.concatenate(right).astype(np.int32),
+            default_left=np.concatenate(default_left),
+            value=threshold,
+            roots=np.asarray(roots, dtype=np.int32),
+            base_score=float(learner['learner_model_param']['base_score'].strip('[]')),
+            feature_names=getattr(model, 'feature_names_in_', None),
+        )
+
+    def predict(self, X):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        return self.combine(self.leaf_values(X))
+
+    def leaf_values(self, X, trees=slice(None)):
+        """Leaf value reached by every row in each tree of `trees`, as an (n_rows, n_trees) array."""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        roots = np.asarray(self.roots[trees], dtype=np.intp)
+        leaf = walk_leaves(
+            X, roots, self.feature, self.left, self.right,
+            lambda values, node: np.where(np.isnan(values), self.default_left[node], values < self.threshold[node]),
+        )
+        return self.value[leaf].reshape(len(X), len(roots))
+
+    def combine(self, leaf_values):
+        """Sums the trees' outputs on top of base_score, in float32 and tree order."""
+        predictions = np.full(len(leaf_values), self.base_score, dtype=np.float32)
+        for tree in range(leaf_values.shape[1]):
+            predictions += leaf_values[:, tree]
+        return predictions
+
+
+class FlatLinearModel:
+    """A fitted sklearn linear regressor reduced to X @ coef + intercept."""
+    def __init__(self, coef, intercept, feature_names=None):
+        self.coef = coef
+        self.intercept = intercept
+        if feature_names is not None:
+            self.feature_names_in_ = np.asarray(feature_names, dtype=object)
+
+    @classmethod
+    def from_model(cls, model):
+        if not is_linear_model(model):
+            raise TypeError(f"Cannot flatten {type(model).__name__}, expected a fitted linear regressor")
+        return cls(model.coef_, model.intercept_, getattr(model, 'feature_names_in_', None))
+
+    def predict(self, X):
+        X = np.asarray(X)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        return X @ self.coef + self.intercept
+
+
+def compile_model(model):
+    """
+    Flattened inference engine for `model` when one applies (forests,
+    XGBoost, linear models), `model` itself otherwise.
+    """
+    try:
+        if is_tree_ensemble(model):
+            return FlatForest.from_model(model, keep_reference=True)
+        if is_xgboost_model(model):
+            return FlatBoostedTrees.from_model(model)
+        if is_linear_model(model):
+            return FlatLinearModel.from_model(model)
+    except TypeError as e:
+        logging.info(f"Serving {type(model).__name__} as is: {e}")
+    return model
+
+
+def verify_engine(engine, model, X):
+    """True if `engine` predicts exactly what `model` does on X."""
+    X = np.asarray(X, dtype=np.float32)
+    return np.array_equal(engine.predict(X), model.predict(X))
+
+
+def export_forest(model, forest_dir, source_path=None, X_check=None):
+    """
+    Flattens a tree ensemble and saves it for memory-mapped loading. With
+    `X_check`, the export is first checked to predict exactly what `model`
+    does on those rows.
+    """
+    forest = FlatForest.from_model(model)
+    if X_check is not None and not verify_engine(forest, model, X_check):
+        raise ValueError(f"Flattened {type(model).__name__} predictions differ from the model's")
+    forest.save(forest_dir, source_path=source_path)
+    logging.info(f"Exported {type(model).__name__} node arrays to {forest_dir}")
+
+
+def forest_export_is_fresh(forest_dir, model_path):
+    """
+    True if `forest_dir` holds an export of the current `model_path`, or if
+    only the export was deployed. The model is only hashed when its size or
+    modification time differ from the recorded ones.
+    """
+    meta_path = os.path.join(forest_dir, FOREST_META_FILE)
+    if not os.path.exists(meta_path):
+        return False
+    # Exports from before an array was added cannot be loaded
+    if not all(os.path.exists(os.path.join(forest_dir, f'{name}.npy')) for name in FOREST_ARRAYS):
+        return False
+
+    model_fingerprint = file_fingerprint(model_path)
+    if model_fingerprint is None:
+        return True
+
+    with open(meta_path, 'r') as file:
+        meta = json.load(file)
+    if meta.get('source') == model_fingerprint:
+        return True
+    return meta.get('source_sha256') is not None and meta['source_sha256'] == file_hash(model_path)
+
+
+def load_model(model_path, forest_dir=None, mmap=True, compile=True):
+    """
+    Loads the trained model, preferring a memory-mapped FlatForest export in
+    `forest_dir` when it is up to date with `model_path`. Otherwise the
+    pickled model is flattened into an inference engine by compile_model.
+    """
+    if mmap and forest_dir:
+        if forest_export_is_fresh(forest_dir, model_path):
+            return FlatForest.load(forest_dir, mmap_mode='r')
+        if os.path.exists(os.path.join(forest_dir, FOREST_META_FILE)):
+            logging.warning(
+                f"Forest export in {forest_dir} is not an export of {model_path}, "
+                f"unpickling the model in this process instead of memory-mapping the export"
+            )
+    # Models saved with joblib.dump unpickle as bare arrays with pickle.load;
+    # joblib.load reads them and plain pickles alike
+    model = joblib.load(model_path)
+    return compile_model(model) if compile else model
+
+
+if __name__ == '__main__':
+    # Export the current artifacts/model.pkl, checked against the transformed test set when available
+    model_path = os.path.join('artifacts', 'model.pkl')
+    test_path = os.path.join('artifacts', 'test_transformed.parquet')
+    X_check = load_frame(test_path).iloc[:, 1:] if os.path.exists(test_path) else None
+    export_forest(joblib.load(model_path), os.path.join('artifacts', 'model_forest'), source_path=model_path, X_check=X_check)
@@ -0,0 +1,134 @@
+import os
+import sys
+import json
+
+import pandas as pd
+
+from src.exception import CustomException
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+
+PARQUET_EXTENSIONS = ('.parquet', '.pq')
+ARROW_EXTENSIONS = ('.arrow', '.feather', '.ipc')
+
+# Parquet schema metadata holding the categories of numeric categoricals,
+# which pyarrow reads back as plain numbers
+CATEGORIES_METADATA_KEY = b'frames.numeric_categories'
+
+
+def frame_format(file_path):
+    """'parquet', 'arrow' (Arrow IPC / Feather) or 'csv', from the file extension."""
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension in PARQUET_EXTENSIONS:
+        return 'parquet'
+    if extension in ARROW_EXTENSIONS:
+        return 'arrow'
+    return 'csv'
+
+
+def save_frame(df, file_path):
+    """
+    Saves a stage's output DataFrame. Parquet and Arrow files keep the
+    dtypes, categoricals included, so the next stage gets the frame back as
+    it was written. pyarrow reads numeric categoricals back from Parquet as
+    plain numbers, so their categories are stored in the file's metadata and
+    restored by load_frame.
+    """
+    try:
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        file_format = frame_format(file_path)
+        if file_format == 'parquet':
+            _write_parquet(df, file_path)
+        elif file_format == 'arrow':
+            df.reset_index(drop=True).to_feather(file_path)
+        else:
+            df.to_csv(file_path, index=False, header=True)
+
+    except Exception as e:
+        raise CustomException(e, sys)
+
+
+def _numeric_categories(df):
+    return {
+        col: {'categories': dtype.categories.tolist(), 'ordered': bool(dtype.ordered)}
+        for col, dtype in df.dtypes.items()
+        if isinstance(dtype, pd.CategoricalDtype) and pd.api.types.is_numeric_dtype(dtype.categories)
+    }
+
+
+def _write_parquet(df, file_path):
+    categories = _numeric_categories(df)
+    if pa is None or not categories:
+        df.to_parquet(file_path, index=False)
+        return
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = {**(table.schema.metadata or {}), CATEGORIES_METADATA_KEY: json.dumps(categories).encode()}
+    pq.write_table(table.replace_schema_metadata(metadata), file_path)
+
+
+def _read_parquet(file_path, columns=None):
+    df = pd.read_parquet(file_path, columns=columns)
+    metadata = (pq.read_schema(file_path).metadata or {}) if pq is not None else {}
+    if CATEGORIES_METADATA_KEY in metadata:
+        for col, dtype in json.loads(metadata[CATEGORIES_METADATA_KEY]).items():
+            if col in df:
+                df[col] = df[col].astype(pd.CategoricalDtype(dtype['categories'], ordered=dtype['ordered']))
+    return df
+
+
+def load_frame(file_path, columns=None):
+    """Loads a DataFrame saved by save_frame, reading only `columns` if given."""
+    try:
+        file_format = frame_format(file_path)
+        if file_format == 'parquet':
+            return _read_parquet(file_path, columns)
+        if file_format == 'arrow':
+            return pd.read_feather(file_path, columns=columns)
+        return pd.read_csv(file_path, usecols=columns)
+
+    except Exception as e:
+        raise CustomException(e, sys)
+
+
+class FrameWriter:
+    """
+    Appends DataFrame chunks to one Parquet, Arrow or CSV file, for outputs
+    written chunk by chunk. The first chunk fixes the schema.
+    """
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.file_format = frame_format(file_path)
+        self._schema = None
+        self._writer = None
+
+    def write(self, df):
+        if self.file_format == 'csv':
+            df.to_csv(self.file_path, mode='a' if self._schema else 'w', header=not self._schema, index=False)
+            self._schema = True
+            return
+
+        table = pa.Table.from_pandas(df, schema=self._schema, preserve_index=False)
+        if self._writer is None:
+            os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
+            self._schema = table.schema
+            if self.file_format == 'parquet':
+                self._writer = pq.ParquetWriter(self.file_path, self._schema)
+            else:
+                self._writer = pa.ipc.new_file(self.file_path, self._schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,307 @@
+import os
+import sys
+import json
+import time
+import platform
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import numpy as np
+from threadpoolctl import ThreadpoolController
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from src.exception import CustomException
+from src.logger import logging
+from src.utils import get_parallel_budget
+
+
+# Execution strategies of one predict call
+SERIAL, ROWS, TREES = 'serial', 'rows', 'trees'
+
+# Server worker processes sharing the host's cores, as read by gunicorn
+WORKERS_ENV = 'WEB_CONCURRENCY'
+
+
+@dataclass
+class ParallelPredictConfig:
+    # Threads one prediction may use, 1 always predicts serially. None or
+    # negative counts from os.cpu_count() as in joblib, divided between the
+    # server's worker processes.
+    n_jobs: Optional[int] = None
+    # Batch size from which predictions run in parallel, None calibrates it
+    # on the loaded model
+    min_parallel_rows: Optional[int] = None
+    # Batch sizes timed during calibration, and runs of each kept (the fastest)
+    calibration_sizes: Tuple[int, ...] = (128, 512, 2048, 8192)
+    calibration_repeats: int = 3
+    # A parallel strategy must beat serial by this factor to be picked
+    min_speedup: float = 1.2
+    # BLAS/OpenMP threads allowed inside each parallel task
+    inner_threads: int = 1
+
+
+class _NestedThreadLimit:
+    """
+    Caps BLAS/OpenMP thread pools while any parallel prediction is running.
+    The limits are process-wide, so they are applied by the first of several
+    concurrent predictions and restored by the last one.
+
+    The loaded libraries are inspected once, on first use, since that costs
+    over a millisecond; by then the model and its libraries are loaded.
+    """
+    def __init__(self, limits):
+        self.limits = limits
+        self._lock = threading.Lock()
+        self._active = 0
+        self._controller = None
+        self._limiter = None
+
+    def __enter__(self):
+        with self._lock:
+            if self._active == 0:
+                if self._controller is None:
+                    self._controller = ThreadpoolController()
+                self._limiter = self._controller.limit(limits=self.limits)
+            self._active += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        with self._lock:
+            self._active -= 1
+            if self._active == 0:
+                self._limiter.restore_original_limits()
+                self._limiter = None
+
+
+def worker_processes():
+    """Worker processes the server runs, from WEB_CONCURRENCY, 1 when unset."""
+    try:
+        return max(1, int(os.environ.get(WORKERS_ENV, 1)))
+    except ValueError:
+        return 1
+
+
+def predict_threads(n_jobs):
+    """Threads each worker process gets for one prediction with `n_jobs`."""
+    if n_jobs is not None and n_jobs > 0:
+        return n_jobs
+    _, threads = get_parallel_budget(n_jobs, worker_processes())
+    return threads
+
+
+class CalibrationPlans:
+    """
+    Calibration plans by model and settings, kept in memory and in a JSON
+    file when `path` is set, so a model is calibrated once instead of on
+    every load in every worker. Workers of one host calibrating the same
+    model at once queue on a lock of the file: the first one calibrates and
+    the others read its plan. Failing to persist only costs a recalibration.
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self._plans = {}
+        self._lock = threading.Lock()
+
+    def get_or_calibrate(self, key, calibrate):
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is None:
+                plan = self._from_file(key, calibrate) if self.path else calibrate()
+                plan = self._plans[key] = [tuple(step) for step in plan]
+            return plan
+
+    def _from_file(self, key, calibrate):
+        try:
+            file = os.fdopen(os.open(self.path, os.O_RDWR | os.O_CREAT), 'r+')
+        except OSError as e:
+            logging.warning(f"Cannot open calibration plans in {self.path}, calibrating without saving: {e}")
+            return calibrate()
+
+        with file:
+            if fcntl is not None:
+                fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                plans = json.load(file)
+            except ValueError:
+                plans = {}
+            if key in plans:
+                logging.info(f"Reusing calibration plan {plans[key]} from {self.path}")
+                return plans[key]
+
+            plans[key] = plan = calibrate()
+            try:
+                file.seek(0)
+                file.truncate()
+                json.dump(plans, file, indent=4)
+            except OSError as e:
+                logging.warning(f"Cannot save calibration plan to {self.path}: {e}")
+            return plan
+
+
+def supports_tree_split(model):
+    return hasattr(model, 'leaf_values') and hasattr(model, 'combine')
+
+
+def calibration_rows(model, n_features, n_rows, random_state=42):
+    """
+    Synthetic rows for timing `model`. Each feature is drawn from the
+    model's own split thresholds when it has node arrays, so rows follow
+    realistic paths through the trees; zeros otherwise.
+    """
+    X = np.zeros((n_rows, n_features), dtype=np.float32)
+    feature = getattr(model, 'feature', None)
+    if feature is None:
+        return X
+
+    rng = np.random.default_rng(random_state)
+    feature, threshold = np.asarray(feature), np.asarray(model.threshold)
+    is_split = np.asarray(model.left) != -1
+    for col in range(n_features):
+        thresholds = threshold[is_split & (feature == col)]
+        if len(thresholds):
+            X[:, col] = rng.choice(thresholds, n_rows)
+    return X
+
+
+class AdaptivePredictor:
+    """
+    Wraps a model so each predict call picks how to run from its batch size:
+    serially below `threshold` rows, where dispatching to threads costs more
+    than it saves, and above it split over row chunks, or over slices of the
+    trees for engines exposing leaf_values/combine. Predictions are the same
+    either way, since rows are independent and tree outputs are combined in
+    order.
+
+    Unless min_parallel_rows is set, calibrate() times each strategy on the
+    loaded model at a few batch sizes and keeps the fastest per size. Given
+    `plans` and a `model_id` identifying the model's content, the plan is
+    looked up there and only calibrated when missing. Tree and row kernels
+    release the GIL, so the tasks run on a thread pool, created on first use
+    in each process so it is never inherited across a fork.
+    """
+    def __init__(self, model, n_features, config=None, plans=None, model_id=None):
+        self.parallel_predict_config = config or ParallelPredictConfig()
+        self.model = model
+        self.n_features = n_features
+        self.n_workers = predict_threads(self.parallel_predict_config.n_jobs)
+        self.strategies = [ROWS, TREES] if supports_tree_split(model) else [ROWS]
+        # (batch size, strategy) pairs by ascending size, from calibration
+        self.plan = []
+        self.threshold = self.parallel_predict_config.min_parallel_rows
+        self._thread_limit = _NestedThreadLimit(self.parallel_predict_config.inner_threads)
+        self._executor = None
+        self._executor_pid = None
+        self._executor_lock = threading.Lock()
+
+        if self.n_workers == 1:
+            self.threshold = None
+        elif self.threshold is not None:
+            self.plan = [(self.threshold, ROWS)]
+        elif plans is not None and model_id is not None:
+            self.set_plan(plans.get_or_calibrate(self.plan_key(model_id), self.calibrate))
+        else:
+            self.calibrate()
+
+    def predict(self, X):
+        return self._run(self.strategy(len(X)), X)
+
+    def strategy(self, n_rows):
+        if self.threshold is None or n_rows < self.threshold:
+            return SERIAL
+        strategy = self.plan[0][1]
+        for size, size_strategy in self.plan:
+            if size > n_rows:
+                break
+            strategy = size_strategy
+        return strategy
+
+    def set_plan(self, plan):
+        self.plan = [tuple(step) for step in plan]
+        self.threshold = self.plan[0][0] if self.plan else None
+
+    def plan_key(self, model_id):
+        """What a plan depends on besides the model: the engine, the host and the calibration settings."""
+        config = self.parallel_predict_config
+        return '|'.join(map(str, [
+            model_id, type(self.model).__name__, platform.node(), os.cpu_count(), self.n_workers,
+            sorted(config.calibration_sizes), config.calibration_repeats, config.min_speedup, config.inner_threads,
+        ]))
+
+    def calibrate(self):
+        """
+        Times every strategy at each calibration size and sets the plan and
+        threshold. The timing runs on a pool of its own, shut down before
+        returning, so no thread is left behind e.g. in a master about to fork.
+        """
+        try:
+            config = self.parallel_predict_config
+            timings = {}
+            with ThreadPoolExecutor(max_workers=self.n_workers, thread_name_prefix='parallel-calibrate') as executor:
+                for size in sorted(config.calibration_sizes):
+                    X = calibration_rows(self.model, self.n_features, size)
+                    timings[size] = {
+                        strategy: self._time(strategy, X, executor)
+                        for strategy in [SERIAL, *self.strategies]
+                    }
+
+            plan = []
+            for size, times in timings.items():
+                best = min(self.strategies, key=times.get)
+                if times[best] * config.min_speedup < times[SERIAL]:
+                    plan.append((size, best))
+                else:
+                    # Parallel has to win at every larger size too
+                    plan = []
+
+            self.set_plan(plan)
+            logging.info(
+                f"Calibrated parallel prediction for {type(self.model).__name__} on {self.n_workers} threads: "
+                f"parallel from {self.threshold} rows, plan {plan}, timings {timings}"
+            )
+            return self.plan
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def _time(self, strategy, X, executor):
+        best = float('inf')
+        for _ in range(self.parallel_predict_config.calibration_repeats):
+            start = time.perf_counter()
+            self._run(strategy, X, executor)
+            best = min(best, time.perf_counter() - start)
+        return best
+
+    def _run(self, strategy, X, executor=None):
+        if strategy == SERIAL:
+            return self.model.predict(X)
+
+        executor = executor or self._get_executor()
+        with self._thread_limit:
+            if strategy == TREES:
+                n_trees = self.model.n_estimators
+                bounds = np.linspace(0, n_trees, min(self.n_workers, n_trees) + 1).astype(int)
+                parts = executor.map(
+                    lambda trees: self.model.leaf_values(X, trees),
+                    [slice(start, end) for start, end in zip(bounds[:-1], bounds[1:])],
+                )
+                return self.model.combine(np.hstack(list(parts)))
+
+            chunks = np.array_split(np.asarray(X), min(self.n_workers, len(X)))
+            return np.concatenate(list(executor.map(self.model.predict, chunks)))
+
+    def _get_executor(self):
+        pid = os.getpid()
+        if self._executor_pid != pid:
+            with self._executor_lock:
+                if self._executor_pid != pid:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.n_workers, thread_name_prefix='parallel-predict'
+                    )
+                    self._executor_pid = pid
+        return self._executor
@@ -1,82 +1,60 @@
+import os
 import sys
-import pandas as pd
+import threading
+from dataclasses import dataclass
+
 import numpy as np
-import json
-import joblib
 
 from src.exception import CustomException
 from src.logger import logging
-from src.utils import load_object, load_json_object, get_value_from_dict
+from src.encoder import FeatureEncoder
+from src.forest import load_model
 
 
-manufacturers_dict = load_json_object('artifacts/Manufacturer.json')
-models_dict = load_json_object('artifacts/Model.json')
-categories_dict = load_json_object('artifacts/Category.json')
-fuel_types_dict = load_json_object('artifacts/Fuel_type.json')
-gear_box_types_dict = load_json_object('artifacts/Gear_box_type.json')
-drive_wheels_dict = load_json_object('artifacts/Drive_wheels.json')
-colors_dict = load_json_object('artifacts/Color.json')
+@dataclass
+class PredictPipelineConfig:
+    artifacts_dir: str = 'artifacts'
+    model_file_path: str = os.path.join('artifacts', 'model.pkl')
+    forest_dir: str = os.path.join('artifacts', 'model_forest')
 
 
 class PredictPipeline:
+    """
+    Loads the encoder and model lazily on first use and keeps them for the
+    lifetime of the pipeline. Call `warmup()` to pay that cost up front.
+    """
     def __init__(self) -> None:
-        pass
+        self.predict_pipeline_config = PredictPipelineConfig()
+        self._encoder = None
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _load_artifacts(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    try:
+                        config = self.predict_pipeline_config
+                        self._encoder = FeatureEncoder.from_artifacts(config.artifacts_dir, fallback='mean')
+                        self._model = self._encoder.bind_model(load_model(config.model_file_path, config.forest_dir))
+                        logging.info('Loaded prediction artifacts')
+
+                    except Exception as e:
+                        raise CustomException(e, sys)
+
+        return self._encoder, self._model
+
+    def warmup(self):
+        """Loads the artifacts and runs one prediction so the first real call is fast."""
+        encoder, model = self._load_artifacts()
+        model.predict(np.zeros((1, encoder.n_features), dtype=np.float32))
+        return self
         
     def predict_used_car_price(self, **kwargs):
         """Util function to predict the price of a used car."""
-
-        feature_columns = load_json_object('artifacts/columns.json')
-        mileage_scaler = joblib.load('artifacts/mileage_scaler.pkl')
-        model = joblib.load('artifacts/model.pkl')
-        x = np.zeros(len(feature_columns['data_columns']))
-        
-        for key, value in kwargs.items():
-            
-            if key == 'levy':
-                x[0] = value
-            
-            elif key == 'manufacturer':
-                x[1] = get_value_from_dict(value, manufacturers_dict['Manufacturers'])
-            
-            elif key == 'model':
-                x[2] = get_value_from_dict(value, models_dict['Models'])
-            
-            elif key == 'prod_year':
-                x[3] = value
-            
-            elif key == 'category':
-                x[4] = get_value_from_dict(value, categories_dict['Categorys'])
-            
-            elif key == 'interior':
-                x[5] = 1 if value == 'Leather' else 0
-            
-            elif key == 'fuel_type':
-                x[6] = get_value_from_dict(value, fuel_types_dict['Fuel_types'])
-            
-            elif key == 'engine_volume':
-                x[7] = value
-            
-            elif key == 'mileage':
-                mileage_df = pd.DataFrame([[value]], columns=['Mileage'])
-                x[8] = mileage_scaler.transform(mileage_df)[0][0]
-            
-            elif key == 'cylinder':
-                x[9] = value
-            
-            elif key == 'gear_box_type':
-                x[10] = get_value_from_dict(value, gear_box_types_dict['Gear_box_types'])
-            
-            elif key == 'drive_wheel':
-                x[11] = get_value_from_dict(value, drive_wheels_dict['Drive_wheelss'])
-            
-            elif key == 'color':
-                x[12] = get_value_from_dict(value, colors_dict['Colors'])
-            
-            elif key == 'airbag':
-                x[13] = value
-        
-        x_df = pd.DataFrame([x], columns=feature_columns['data_columns'])
-        return model.predict(x_df)[0]
+        encoder, model = self._load_artifacts()
+        x = encoder.encode(kwargs)
+        return model.predict(x.reshape(1, -1))[0]
     
 
 class CustomData:
@@ -0,0 +1,181 @@
+import os
+import sys
+import json
+import hashlib
+from dataclasses import asdict, dataclass, field
+
+from src.exception import CustomException
+from src.logger import logging
+from src.forest import FOREST_META_FILE, file_fingerprint, file_hash
+from src.frames import load_frame, save_frame
+from src.components.data_ingestion import DataIngestion, DataIngestionConfig
+from src.components.data_transformation import DataTransformation, DataTransformationConfig
+from src.components.model_trainer import ModelTrainer, ModelTrainerConfig
+
+
+# Source files each stage's code version is hashed from, relative to src/
+STAGE_SOURCES = {
+    'ingestion': [
+        'components/data_ingestion.py', 'components/target_encoding.py', 'sketch.py', 'frames.py',
+    ],
+    'transformation': ['components/data_transformation.py', 'frames.py'],
+    'training': ['components/model_trainer.py', 'forest.py', 'utils.py'],
+}
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def code_version(stage):
+    """Hash of the source files of a stage, so editing them re-runs it."""
+    return {path: file_hash(os.path.join(SRC_DIR, path)) for path in STAGE_SOURCES[stage]}
+
+
+def fingerprint(inputs):
+    payload = json.dumps(inputs, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+@dataclass
+class TrainPipelineConfig:
+    manifest_file_path: str = os.path.join('artifacts', 'pipeline_manifest.json')
+    # Transformation outputs, cached so training can run on its own
+    transformed_train_path: str = os.path.join('artifacts', 'train_transformed.parquet')
+    transformed_test_path: str = os.path.join('artifacts', 'test_transformed.parquet')
+    # Re-run every stage even when its cached outputs are up to date
+    force: bool = False
+    ingestion: DataIngestionConfig = field(default_factory=DataIngestionConfig)
+    transformation: DataTransformationConfig = field(default_factory=DataTransformationConfig)
+    training: ModelTrainerConfig = field(default_factory=ModelTrainerConfig)
+
+
+class TrainPipeline:
+    """
+    Runs ingestion, transformation and training, skipping every stage whose
+    inputs have not changed since its outputs were written.
+
+    A stage's fingerprint covers its inputs (the raw CSV's content hash for
+    ingestion, the previous stage's fingerprint otherwise), its config and
+    the source of its code. Fingerprints and output file stats are kept in
+    artifacts/pipeline_manifest.json. A stage re-runs when its fingerprint
+    changes or an output is missing or was modified, and then every stage
+    after it does too, so editing a model hyperparameter re-runs training
+    only.
+    """
+    def __init__(self, config=None):
+        self.train_pipeline_config = config or TrainPipelineConfig()
+        self._manifest = None
+
+    def run(self):
+        try:
+            config = self.train_pipeline_config
+            ingestion = DataIngestion(config.ingestion)
+            transformation = DataTransformation(config.transformation)
+            trainer = ModelTrainer(config.training)
+
+            ingestion_fingerprint = fingerprint({
+                'source': file_hash(config.ingestion.source_data_path),
+                'config': asdict(config.ingestion),
+                'code': code_version('ingestion'),
+            })
+            train_path, test_path = self._run_stage(
+                'ingestion', ingestion_fingerprint,
+                run=ingestion.initiate_data_ingestion,
+                outputs=ingestion.output_files,
+            )
+
+            transformation_fingerprint = fingerprint({
+                'upstream': ingestion_fingerprint,
+                'config': asdict(config.transformation),
+                'code': code_version('transformation'),
+            })
+            self._run_stage(
+                'transformation', transformation_fingerprint,
+                run=lambda: self._transform(transformation, train_path, test_path),
+                outputs=lambda: [
+                    config.transformed_train_path,
+                    config.transformed_test_path,
+                    config.transformation.mileage_scaler_file_path,
+                ],
+            )
+
+            training_fingerprint = fingerprint({
+                'upstream': transformation_fingerprint,
+                'config': asdict(config.training),
+                'code': code_version('training'),
+            })
+            return self._run_stage(
+                'training', training_fingerprint,
+                run=lambda: self._train(trainer),
+                outputs=lambda: self._training_outputs(config.training),
+            )
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def _transform(self, transformation, train_path, test_path):
+        train_df, test_df, _ = transformation.initiate_data_transformation(train_path, test_path)
+        save_frame(train_df, self.train_pipeline_config.transformed_train_path)
+        save_frame(test_df, self.train_pipeline_config.transformed_test_path)
+
+    def _train(self, trainer):
+        # Read back from disk so a cached transformation stage is handled the
+        # same way as a fresh one
+        train_df = load_frame(self.train_pipeline_config.transformed_train_path)
+        test_df = load_frame(self.train_pipeline_config.transformed_test_path)
+        return float(trainer.initiate_model_trainer(train_df, test_df))
+
+    @staticmethod
+    def _training_outputs(trainer_config):
+        outputs = [trainer_config.trained_model_file_path, trainer_config.columns_file_path]
+        forest_meta = os.path.join(trainer_config.trained_forest_dir, FOREST_META_FILE)
+        if os.path.exists(forest_meta):
+            outputs.append(forest_meta)
+        return outputs
+
+    def _run_stage(self, name, stage_fingerprint, run, outputs):
+        """Runs a stage, or returns its cached result when it is up to date."""
+        manifest = self._load_manifest()
+        cached = manifest.get(name)
+        if not self.train_pipeline_config.force and self._is_fresh(cached, stage_fingerprint):
+            logging.info(f"Skipping {name} stage, outputs are up to date")
+            return cached['result']
+
+        logging.info(f"Running {name} stage")
+        result = run()
+        manifest[name] = {
+            'fingerprint': stage_fingerprint,
+            'outputs': {path: file_fingerprint(path) for path in outputs()},
+            'result': result,
+        }
+        self._save_manifest()
+        return result
+
+    @staticmethod
+    def _is_fresh(cached, stage_fingerprint):
+        if not cached or cached['fingerprint'] != stage_fingerprint:
+            return False
+        return all(
+            recorded is not None and file_fingerprint(path) == recorded
+            for path, recorded in cached['outputs'].items()
+        )
+
+    def _load_manifest(self):
+        if self._manifest is None:
+            manifest_path = self.train_pipeline_config.manifest_file_path
+            if os.path.exists(manifest_path):
+                with open(manifest_path, 'r') as file:
+                    self._manifest = json.load(file)
+            else:
+                self._manifest = {}
+        return self._manifest
+
+    def _save_manifest(self):
+        manifest_path = self.train_pipeline_config.manifest_file_path
+        os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+        tmp_path = manifest_path + '.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump(self._manifest, file, indent=4)
+        os.replace(tmp_path, manifest_path)
+
+
+if __name__ == '__main__':
+    print(TrainPipeline().run())
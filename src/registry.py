@@ -0,0 +1,259 @@
+import os
+import sys
+import signal
+import hashlib
+import threading
+import time
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, Mapping, Optional, Union
+
+import joblib
+
+from src.exception import CustomException
+from src.logger import logging
+from src.encoder import CATEGORY_FIELDS, CategoryIndex, FeatureEncoder
+from src.forest import FOREST_META_FILE, file_fingerprint, file_hash, load_model
+from src.parallel import AdaptivePredictor, CalibrationPlans, ParallelPredictConfig
+from src.utils import load_json_object
+
+
+# JSON artifacts: artifact key -> file name inside the artifacts directory
+JSON_ARTIFACTS = {
+    'manufacturers_columns': 'Manufacturer.json',
+    'models_columns': 'Model.json',
+    'categories_columns': 'Category.json',
+    'colors_columns': 'Color.json',
+    'gear_box_types_columns': 'Gear_box_type.json',
+    'fuel_types_columns': 'Fuel_type.json',
+    'drive_wheels_columns': 'Drive_wheels.json',
+    'manufacturers_to_models_columns': 'manufactures_to_models.json',
+}
+
+# Key lists served to the front end: list name -> (artifact key, dict name)
+KEY_LISTS = {
+    'manufacturers': ('manufacturers_columns', 'Manufacturers'),
+    'models': ('models_columns', 'Models'),
+    'categories': ('categories_columns', 'Categorys'),
+    'colors': ('colors_columns', 'Colors'),
+    'gear_boxes': ('gear_box_types_columns', 'Gear_box_types'),
+    'fuels': ('fuel_types_columns', 'Fuel_types'),
+    'drive_wheels': ('drive_wheels_columns', 'Drive_wheelss'),
+}
+
+
+def freeze(obj):
+    """
+    Recursively turn dicts into read-only mapping views and lists into tuples.
+    """
+    if isinstance(obj, dict):
+        return MappingProxyType({key: freeze(value) for key, value in obj.items()})
+    if isinstance(obj, list):
+        return tuple(freeze(value) for value in obj)
+    return obj
+
+
+def thaw(obj):
+    """
+    Inverse of `freeze`, used where a plain JSON-serializable copy is needed.
+    """
+    if isinstance(obj, Mapping):
+        return {key: thaw(value) for key, value in obj.items()}
+    if isinstance(obj, tuple):
+        return [thaw(value) for value in obj]
+    return obj
+
+
+@dataclass
+class ArtifactRegistryConfig:
+    artifacts_dir: str = 'artifacts'
+    columns_file_name: str = 'columns.json'
+    scaler_file_name: str = 'mileage_scaler.pkl'
+    model_file_name: str = 'model.pkl'
+    forest_dir_name: str = 'model_forest'
+    # Serve a memory-mapped forest export instead of unpickling model.pkl when one is available
+    mmap_model: bool = True
+    # Encoding of unknown categories: a number, 'mean' or 'median'
+    category_fallback: Union[float, str] = 0
+    # Seconds between artifact directory version checks, None disables polling
+    check_interval: Optional[float] = 5.0
+    # How large batch predictions are spread over threads, calibrated once per model
+    parallel_predict: ParallelPredictConfig = field(default_factory=ParallelPredictConfig)
+    # Calibration plans kept across restarts and shared by the workers, in
+    # the artifacts directory but outside its version. None keeps them in memory.
+    parallel_plans_file_name: Optional[str] = 'parallel_plans.json'
+
+
+@dataclass(frozen=True)
+class ArtifactSnapshot:
+    """
+    One consistent, read-only set of artifacts loaded from a single
+    version of the artifacts directory.
+    """
+    version: str
+    artifacts: Mapping[str, Any]
+
+    def __getitem__(self, key):
+        return self.artifacts[key]
+
+    def get(self, key, default=None):
+        return self.artifacts.get(key, default)
+
+
+class ArtifactRegistry:
+    """
+    Process-wide artifact holder. Artifacts are loaded once and swapped
+    atomically on `reload()`, on a reload signal, or when the files in the
+    artifacts directory change.
+    """
+    def __init__(self, config: Optional[ArtifactRegistryConfig] = None, builders=None):
+        self.registry_config = config or ArtifactRegistryConfig()
+        # Extra artifacts derived from the loaded ones: name -> build(artifacts)
+        self.builders = dict(builders or {})
+        self._snapshot: Optional[ArtifactSnapshot] = None
+        self._lock = threading.Lock()
+        self._reload_requested = False
+        self._last_check = 0.0
+        plans_file_name = self.registry_config.parallel_plans_file_name
+        self.parallel_plans = CalibrationPlans(plans_file_name and self.artifact_path(plans_file_name))
+        # (path, size and mtime) -> content hash of the last model hashed
+        self._model_digest = (None, None)
+
+    def artifact_path(self, file_name):
+        return os.path.join(self.registry_config.artifacts_dir, file_name)
+
+    def artifact_files(self):
+        config = self.registry_config
+        return [
+            *JSON_ARTIFACTS.values(),
+            config.columns_file_name,
+            config.scaler_file_name,
+            config.model_file_name,
+            os.path.join(config.forest_dir_name, FOREST_META_FILE),
+        ]
+
+    def current_version(self):
+        """
+        Fingerprint of the artifacts directory built from file sizes and
+        modification times, so checking it never reads file contents.
+        """
+        stats = []
+        for file_name in self.artifact_files():
+            try:
+                stat = os.stat(self.artifact_path(file_name))
+                stats.append((file_name, stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                stats.append((file_name, None, None))
+        return hashlib.md5(repr(stats).encode()).hexdigest()[:12]
+
+    def get(self) -> ArtifactSnapshot:
+        """
+        Returns the current snapshot, loading or swapping it first when needed.
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            return self.reload(force=False)
+
+        if self._reload_requested:
+            self._reload_requested = False
+            return self.reload()
+
+        interval = self.registry_config.check_interval
+        if interval is not None:
+            now = time.monotonic()
+            if now - self._last_check >= interval:
+                self._last_check = now
+                if self.current_version() != snapshot.version:
+                    return self.reload(force=False)
+
+        return snapshot
+
+    def reload(self, force=True) -> ArtifactSnapshot:
+        """
+        Builds a new snapshot and swaps it in. A failed reload keeps serving
+        the previous snapshot; only the very first load raises.
+        """
+        with self._lock:
+            current = self._snapshot
+            version = self.current_version()
+            if not force and current is not None and current.version == version:
+                return current
+
+            try:
+                snapshot = self._build_snapshot(version)
+            except Exception as e:
+                if current is None:
+                    raise CustomException(e, sys)
+                logging.error(f"Artifact reload failed, keeping version {current.version}: {e}")
+                return current
+
+            self._snapshot = snapshot
+            self._last_check = time.monotonic()
+            logging.info(f"Loaded artifacts version {version} from {self.registry_config.artifacts_dir}")
+            return snapshot
+
+    def request_reload(self, *args):
+        """
+        Marks the registry for reload on the next `get()`. Safe to use as a
+        signal handler since it does no I/O itself.
+        """
+        self._reload_requested = True
+
+    def install_reload_signal(self, signum=getattr(signal, 'SIGHUP', None)):
+        if signum is not None:
+            signal.signal(signum, self.request_reload)
+
+    def model_digest(self):
+        """
+        Content hash of the served model, or of its export's meta.json when
+        only the export was deployed. Rehashed only when the file changes.
+        """
+        config = self.registry_config
+        path = self.artifact_path(config.model_file_name)
+        if not os.path.exists(path):
+            path = self.artifact_path(os.path.join(config.forest_dir_name, FOREST_META_FILE))
+        fingerprint = (path, *file_fingerprint(path))
+        if self._model_digest[0] != fingerprint:
+            self._model_digest = (fingerprint, file_hash(path))
+        return self._model_digest[1]
+
+    def _build_snapshot(self, version):
+        config = self.registry_config
+        artifacts = {}
+
+        for key, file_name in JSON_ARTIFACTS.items():
+            artifacts[key] = load_json_object(self.artifact_path(file_name))
+        artifacts['data_columns'] = load_json_object(self.artifact_path(config.columns_file_name))['data_columns']
+
+        for list_name, (key, dict_name) in KEY_LISTS.items():
+            artifacts[list_name] = list(artifacts[key][dict_name].keys())
+
+        artifacts['scaler'] = joblib.load(self.artifact_path(config.scaler_file_name))
+        artifacts['model_rfr'] = load_model(
+            self.artifact_path(config.model_file_name),
+            self.artifact_path(config.forest_dir_name),
+            mmap=config.mmap_model,
+        )
+        artifacts['model_xgb'] = None
+
+        json_by_file = {file_name: artifacts[key] for key, file_name in JSON_ARTIFACTS.items()}
+        encoder = FeatureEncoder(
+            artifacts['data_columns'],
+            {field: json_by_file[file_name][dict_name] for field, (_, file_name, dict_name) in CATEGORY_FIELDS.items()},
+            artifacts['scaler'],
+            fallback=config.category_fallback,
+        )
+        encoder.bind_model(artifacts['model_rfr'])
+        artifacts['encoder'] = encoder
+        artifacts['model_rfr'] = AdaptivePredictor(
+            artifacts['model_rfr'], encoder.n_features, config.parallel_predict,
+            plans=self.parallel_plans, model_id=self.model_digest(),
+        )
+
+        manufacturers = artifacts['manufacturers_to_models_columns']
+        artifacts['manufacturers_index'] = CategoryIndex({name: name for name in manufacturers})
+
+        for name, build in self.builders.items():
+            artifacts[name] = build(artifacts)
+
+        return ArtifactSnapshot(version=version, artifacts=freeze(artifacts))
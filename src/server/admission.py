@@ -0,0 +1,149 @@
+import math
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+
+import numpy as np
+
+
+@dataclass
+class InferenceQueueConfig:
+    # Predictions running at once
+    workers: int = 2
+    # Requests allowed to wait for a free worker, beyond those running. The
+    # server needs workers + max_queue_depth request threads per process
+    # (gunicorn --threads, 16 in the Dockerfile) for requests to reach the
+    # queue at all instead of waiting unseen in the socket backlog.
+    max_queue_depth: int = 14
+    # Seconds from arrival a request may take, waiting included, before it
+    # is rejected. Clients can ask for less with the X-Request-Deadline-Ms header.
+    deadline_seconds: float = 1.0
+    # Smallest Retry-After sent with a rejection, in seconds
+    retry_after_seconds: int = 1
+    # Recent wait times kept for the percentiles in stats()
+    wait_time_window: int = 1024
+
+
+class QueueRejected(Exception):
+    """Raised when a request is shed instead of queued; maps to a 503."""
+    def __init__(self, reason, retry_after):
+        super().__init__(f"Inference queue rejected the request: {reason}")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class InferenceQueue:
+    """
+    Bounded admission in front of the model. At most `workers` predictions
+    run at once and at most `max_queue_depth` more wait for a slot, in
+    arrival order, on the request threads themselves.
+
+    Requests are shed with QueueRejected instead of piling up:
+    - when the queue is full,
+    - on arrival, when the requests ahead of them and their own prediction,
+      at the average prediction time, would overrun their deadline,
+    - when their deadline comes up while still waiting.
+    So under overload the requests that are accepted keep a bounded latency.
+    """
+    def __init__(self, config=None):
+        self.inference_queue_config = config or InferenceQueueConfig()
+        self._condition = threading.Condition()
+        self._waiting = deque()
+        self._running = 0
+        # Moving average of a prediction's duration, None until the first one
+        self._service_time = None
+        self._wait_times = deque(maxlen=self.inference_queue_config.wait_time_window)
+        self.accepted = 0
+        self.completed = 0
+        self.rejected = {'queue_full': 0, 'deadline': 0, 'timeout': 0}
+        self.max_depth_seen = 0
+
+    def run(self, predict, deadline=None, arrival=None):
+        """
+        Calls `predict()` once a worker is free. `deadline` is in seconds
+        from `arrival` (time.monotonic(), defaults to now).
+        """
+        config = self.inference_queue_config
+        arrival = time.monotonic() if arrival is None else arrival
+        expires_at = self.expires_at(deadline, arrival)
+
+        ticket = object()
+        with self._condition:
+            self._admit(expires_at)
+            self._waiting.append(ticket)
+            self.max_depth_seen = max(self.max_depth_seen, len(self._waiting))
+            try:
+                while self._waiting[0] is not ticket or self._running >= config.workers:
+                    remaining = expires_at - time.monotonic() - (self._service_time or 0.0)
+                    if remaining <= 0:
+                        self.rejected['timeout'] += 1
+                        raise QueueRejected('deadline expired while queued', self.retry_after())
+                    self._condition.wait(remaining)
+            finally:
+                self._waiting.remove(ticket)
+                # The next in line may now be at the head with a free worker
+                self._condition.notify_all()
+
+            self._running += 1
+            self.accepted += 1
+            started = time.monotonic()
+            self._wait_times.append(started - arrival)
+
+        try:
+            return predict()
+        finally:
+            with self._condition:
+                self._running -= 1
+                self.completed += 1
+                duration = time.monotonic() - started
+                self._service_time = duration if self._service_time is None else 0.8 * self._service_time + 0.2 * duration
+                self._condition.notify_all()
+
+    def expires_at(self, deadline, arrival):
+        """Monotonic time a request arriving at `arrival` must be done by."""
+        config = self.inference_queue_config
+        return arrival + (config.deadline_seconds if deadline is None else min(deadline, config.deadline_seconds))
+
+    def _admit(self, expires_at):
+        config = self.inference_queue_config
+        if len(self._waiting) >= config.max_queue_depth:
+            self.rejected['queue_full'] += 1
+            raise QueueRejected('queue full', self.retry_after())
+
+        if self._service_time is not None:
+            # Rounds of `workers` predictions to go through before this one finishes
+            busy = max(0, self._running + len(self._waiting) - config.workers + 1)
+            rounds = math.ceil(busy / config.workers) + 1
+            if time.monotonic() + rounds * self._service_time > expires_at:
+                self.rejected['deadline'] += 1
+                raise QueueRejected('deadline cannot be met', self.retry_after())
+
+    def retry_after(self):
+        """Whole seconds until the current backlog should have drained."""
+        config = self.inference_queue_config
+        backlog = (self._running + len(self._waiting)) / config.workers * (self._service_time or 0.0)
+        return max(config.retry_after_seconds, math.ceil(backlog))
+
+    def stats(self):
+        with self._condition:
+            waits = np.array(self._wait_times) * 1000
+            return {
+                'queue_depth': len(self._waiting),
+                'running': self._running,
+                'workers': self.inference_queue_config.workers,
+                'max_queue_depth': self.inference_queue_config.max_queue_depth,
+                'max_depth_seen': self.max_depth_seen,
+                'accepted': self.accepted,
+                'completed': self.completed,
+                'rejected': dict(self.rejected),
+                'service_time_ms': None if self._service_time is None else self._service_time * 1000,
+                'wait_time_ms': {
+                    'count': len(waits),
+                    'mean': float(waits.mean()) if len(waits) else 0.0,
+                    'p50': float(np.percentile(waits, 50)) if len(waits) else 0.0,
+                    'p95': float(np.percentile(waits, 95)) if len(waits) else 0.0,
+                    'p99': float(np.percentile(waits, 99)) if len(waits) else 0.0,
+                    'max': float(waits.max()) if len(waits) else 0.0,
+                },
+            }
@@ -0,0 +1,119 @@
+import asyncio
+import json
+from functools import partial
+
+from src.server.utils import PredictionService
+from src.server.batching import MicroBatchConfig, MicroBatcher
+from src.server.server import build_app
+
+try:
+    from asgiref.wsgi import WsgiToAsgi
+except ImportError:
+    WsgiToAsgi = None
+
+
+ESTIMATE_PRICE_PATH = '/api/estimate-price'
+
+
+class PredictionASGIApp:
+    """
+    Optional ASGI entry point, e.g. `uvicorn src.server.asgi:app`.
+
+    POST /api/estimate-price is answered through a MicroBatcher, so concurrent
+    requests share one model call, in which identical cars, and cars already
+    being predicted for another request, are predicted once. Every other
+    route is served by the Flask app through asgiref's WSGI adapter when
+    asgiref is installed. Both share `service`, warmed up once at startup.
+    """
+    def __init__(self, config=None, service=None):
+        self.micro_batch_config = config or MicroBatchConfig()
+        self.service = service or PredictionService()
+        self.batcher = None
+        self._flask_app = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http' and scope['path'] == ESTIMATE_PRICE_PATH and scope['method'] == 'POST':
+            await self._estimate_price(scope, receive, send)
+        else:
+            await self._fallback(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await asyncio.get_running_loop().run_in_executor(None, self.service.warmup)
+                    self.batcher = MicroBatcher(partial(self.service.predict_used_car_prices, use_cache=True, coalesce=True), self.micro_batch_config)
+                    self._flask_app = self._wrap_flask_app()
+                    await send({'type': 'lifespan.startup.complete'})
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+            elif message['type'] == 'lifespan.shutdown':
+                if self.batcher is not None:
+                    self.batcher.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _estimate_price(self, scope, receive, send):
+        headers = dict(scope['headers'])
+        content_type = headers.get(b'content-type', b'').split(b';')[0].strip()
+        if not (content_type == b'application/json' or content_type.endswith(b'+json')):
+            return await self._send_json(send, 400, {'error': 'Invalid content type, please send application/json'})
+
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return await self._send_json(send, 400, {'error': 'Invalid JSON body'})
+        if not isinstance(data, dict):
+            return await self._send_json(send, 400, {'error': 'Invalid body, please send a JSON object'})
+
+        if self.batcher is None:
+            self.batcher = MicroBatcher(partial(self.service.predict_used_car_prices, use_cache=True, coalesce=True), self.micro_batch_config)
+
+        try:
+            prediction = await self.batcher.submit(data)
+        except (ValueError, TypeError) as e:
+            return await self._send_json(send, 400, {'error': f'Invalid car fields: {e}'})
+
+        await self._send_json(send, 200, {'predicted_price': prediction})
+
+    async def _fallback(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return
+        if WsgiToAsgi is None:
+            return await self._send_json(send, 404, {'error': 'Not found'})
+
+        if self._flask_app is None:
+            # Only when the server skipped the lifespan protocol
+            self._flask_app = self._wrap_flask_app()
+        await self._flask_app(scope, receive, send)
+
+    def _wrap_flask_app(self):
+        # build_app loads nothing, the Flask routes read the warmed-up service
+        return WsgiToAsgi(build_app(self.service)) if WsgiToAsgi is not None else None
+
+    @staticmethod
+    async def _send_json(send, status, payload):
+        body = json.dumps(payload).encode()
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode()),
+                (b'access-control-allow-origin', b'*'),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+
+app = PredictionASGIApp()
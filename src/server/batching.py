@@ -0,0 +1,97 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from src.logger import logging
+
+
+@dataclass
+class MicroBatchConfig:
+    # A batch is sent to the model once it holds this many cars ...
+    max_batch_size: int = 64
+    # ... or once its first car has waited this long, whichever comes first
+    max_wait_ms: float = 2.0
+    # Threads running model.predict, so the event loop is never blocked
+    workers: int = 1
+
+
+class MicroBatcher:
+    """
+    Collects single-car predictions submitted concurrently from an asyncio
+    event loop and runs them as one vectorized `predict_batch(records)` call
+    in a worker thread, then hands each caller its own result.
+
+    The extra latency a request can pick up is bounded by max_wait_ms plus
+    the time of one batch prediction.
+    """
+    def __init__(self, predict_batch, config=None):
+        self.micro_batch_config = config or MicroBatchConfig()
+        self.predict_batch = predict_batch
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.micro_batch_config.workers, thread_name_prefix='micro-batch'
+        )
+        self._pending = []
+        self._timer = None
+        self._tasks = set()
+
+    async def submit(self, record):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((record, future))
+
+        if len(self._pending) >= self.micro_batch_config.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.micro_batch_config.max_wait_ms / 1000, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        loop = asyncio.get_running_loop()
+        records = [record for record, _ in batch]
+        try:
+            results = await loop.run_in_executor(self._executor, self._predict, records)
+        except Exception as e:
+            results = [(False, e)] * len(batch)
+
+        for (_, future), (ok, value) in zip(batch, results):
+            if future.done():
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    def _predict(self, records):
+        """
+        Predicts the whole batch at once. If that fails, retries car by car so
+        one invalid request does not fail the others batched with it.
+        """
+        try:
+            return [(True, value) for value in self.predict_batch(records)]
+        except Exception as e:
+            if len(records) == 1:
+                return [(False, e)]
+            logging.info(f"Batch of {len(records)} failed, predicting individually: {e}")
+
+        results = []
+        for record in records:
+            try:
+                results.append((True, self.predict_batch([record])[0]))
+            except Exception as e:
+                results.append((False, e))
+        return results
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,96 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass
+class PredictionCacheConfig:
+    # Maximum number of cached predictions, 0 disables the cache
+    max_size: int = 10000
+    # Seconds a prediction stays valid, None keeps it until evicted
+    ttl_seconds: Optional[float] = 3600.0
+    # Round mileage to this many km before predicting, so nearby mileages
+    # share an entry. Applied to every prediction, single or batch, cached
+    # or not, so both endpoints agree. None predicts on the exact mileage.
+    mileage_bucket: Optional[int] = None
+
+
+class PredictionCache:
+    """
+    Thread-safe LRU/TTL cache of predicted prices keyed by the encoded
+    feature vector, so requests that differ only in casing or in unknown
+    category spelling share an entry. The cache empties itself whenever it is
+    used with a different artifacts version than the one it was filled with.
+    """
+    def __init__(self, config=None):
+        self.prediction_cache_config = config or PredictionCacheConfig()
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self):
+        return self.prediction_cache_config.max_size > 0
+
+    def bucket_mileage(self, record):
+        bucket = self.prediction_cache_config.mileage_bucket
+        mileage = record.get('mileage')
+        if not bucket or mileage is None:
+            return record
+        return {**record, 'mileage': round(float(mileage) / bucket) * bucket}
+
+    @staticmethod
+    def key(x):
+        return x.tobytes()
+
+    def _sync_version(self, version):
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+
+    def get(self, version, key):
+        with self._lock:
+            self._sync_version(version)
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, version, key, value):
+        ttl = self.prediction_cache_config.ttl_seconds
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._sync_version(version)
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.prediction_cache_config.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.prediction_cache_config.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'artifacts_version': self._version,
+            }
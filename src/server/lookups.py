@@ -0,0 +1,85 @@
+import gzip
+import hashlib
+import json
+from dataclasses import dataclass, field
+from typing import Dict
+
+from src.registry import JSON_ARTIFACTS, KEY_LISTS
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 256
+
+
+@dataclass(frozen=True)
+class RenderedResponse:
+    """A JSON response body serialized once, with its compressed variants and ETag."""
+    body: bytes
+    etag: str
+    encodings: Dict[str, bytes] = field(default_factory=dict)
+
+    def variant(self, encoding):
+        """Body and strong ETag for a content encoding, None meaning identity."""
+        if encoding is None:
+            return self.body, self.etag
+        return self.encodings[encoding], f'{self.etag[:-1]}-{encoding}"'
+
+
+def render_json(payload):
+    """
+    Serializes `payload` the way Flask's jsonify does in production (sorted
+    keys, compact separators, trailing newline) and precompresses it.
+    """
+    body = (json.dumps(payload, ensure_ascii=True, sort_keys=True, separators=(',', ':')) + '\n').encode()
+    etag = f'"{hashlib.sha1(body).hexdigest()[:20]}"'
+
+    encodings = {}
+    if len(body) >= MIN_COMPRESS_SIZE:
+        if brotli is not None:
+            encodings['br'] = brotli.compress(body)
+        encodings['gzip'] = gzip.compress(body, mtime=0)
+    return RenderedResponse(body=body, etag=etag, encodings=encodings)
+
+
+def render_lookup_responses(artifacts):
+    """
+    Pre-renders every response of the lookup endpoints for one artifacts
+    snapshot. Run by the registry while it builds the snapshot.
+    """
+    objects = {}
+    for obj in [*JSON_ARTIFACTS, *KEY_LISTS, 'data_columns']:
+        objects[obj] = render_json({'objects': artifacts[obj]})
+
+    manufacturers = {
+        name: render_json({name: models})
+        for name, models in artifacts['manufacturers_to_models_columns'].items()
+    }
+
+    values = {}
+    for col_name in JSON_ARTIFACTS:
+        for dict_name, dictionary in artifacts[col_name].items():
+            if not isinstance(dictionary, dict):
+                continue
+            for key, value in dictionary.items():
+                values[(col_name, dict_name, key)] = render_json({key: value})
+
+    return {
+        'objects': objects,
+        'manufacturers': manufacturers,
+        'values': values,
+    }
+
+
+def etag_matches(if_none_match, etag):
+    """Weak comparison of an If-None-Match header against an ETag."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    candidates = [candidate.strip() for candidate in if_none_match.split(',')]
+    return any(candidate.removeprefix('W/') == etag for candidate in candidates)
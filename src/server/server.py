@@ -1,54 +1,142 @@
+import gc
+import json
 import logging
-from flask import Flask, jsonify, request, render_template
+import math
+import time
+from dataclasses import dataclass, field
+from flask import Blueprint, Flask, Response, current_app, jsonify, request, render_template
 from flask_cors import CORS
 
-from src.server import utils
-
-application = Flask(__name__)
-app = application
-CORS(app)
+from src.registry import ArtifactRegistryConfig
+from src.server.utils import PredictionService
+from src.server.admission import InferenceQueueConfig, QueueRejected
+from src.server.cache import PredictionCacheConfig
+from src.server.lookups import etag_matches
 
 # Set up logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-@app.route('/')
+api = Blueprint('api', __name__)
+
+# Key of the app's PredictionService in app.extensions
+SERVICE_EXTENSION = 'prediction_service'
+
+
+@dataclass
+class ServerConfig:
+    registry: ArtifactRegistryConfig = field(default_factory=ArtifactRegistryConfig)
+    prediction_cache: PredictionCacheConfig = field(default_factory=PredictionCacheConfig)
+    inference_queue: InferenceQueueConfig = field(default_factory=InferenceQueueConfig)
+    # Let identical concurrent predictions share one model call
+    coalesce_predictions: bool = True
+    # Load, validate and warm up artifacts inside create_app, i.e. before
+    # gunicorn forks its workers when run with --preload
+    preload_artifacts: bool = True
+
+def get_service():
+    """PredictionService of the app handling the current request."""
+    return current_app.extensions[SERVICE_EXTENSION]
+
+def rendered_response(rendered):
+    """
+    Serves a pre-rendered lookup response, picking a precompressed variant
+    the client accepts and answering 304 when its ETag still matches.
+    """
+    encoding = next(
+        (enc for enc in ('br', 'gzip') if enc in rendered.encodings and request.accept_encodings[enc]),
+        None
+    )
+    body, etag = rendered.variant(encoding)
+
+    if etag_matches(request.headers.get('If-None-Match'), etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+        if encoding is not None:
+            response.headers['Content-Encoding'] = encoding
+    response.headers['ETag'] = etag
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@api.route('/')
 def index():
     return render_template('index.html')
 
-@app.route('/api/object/<obj>/')
+@api.route('/api/object/<obj>/')
 def get_objects_list(obj):
-    objects_keys = utils.get_object_keys(obj)
+    rendered = get_service().get_lookup_response('objects', obj)
+    if rendered is not None:
+        response = rendered_response(rendered)
+        response.headers.add('Access-Control-Allow-Origin', '*')
+        return response
+
+    objects_keys = get_service().get_object_keys(obj)
     response = jsonify({
         'objects': objects_keys
     })
     response.headers.add('Access-Control-Allow-Origin', '*')
     return response
 
-@app.route('/api/column_name/<col_name>/dict_name/<dict_name>/key/<key>/')
+@api.route('/api/column_name/<col_name>/dict_name/<dict_name>/key/<key>/')
 def get_specific_objects_value(col_name, dict_name, key):
-    object_value = utils.get_exact_value(col_name, dict_name, key)
+    rendered = get_service().get_lookup_response('values', (col_name, dict_name, key))
+    if rendered is not None:
+        response = rendered_response(rendered)
+        response.headers.add('Access-Content-Allow-Origin', '*')
+        return response
+
+    object_value = get_service().get_exact_value(col_name, dict_name, key)
     response = jsonify({
         key: object_value
     })
     response.headers.add('Access-Content-Allow-Origin', '*')
     return response
 
-@app.route('/api/manufacturer/<manufacturer_name>/')
+@api.route('/api/manufacturer/<manufacturer_name>/')
 def fetch_manufacturer_models(manufacturer_name):
-    manufacturer_list = utils.get_manufacturer_models(manufacturer_name)
+    rendered = get_service().get_lookup_response('manufacturers', manufacturer_name)
+    if rendered is not None:
+        response = rendered_response(rendered)
+        response.headers.add('Access-Content-Allow-Origin', '*')
+        return response
+
+    manufacturer_list = get_service().get_manufacturer_models(manufacturer_name)
     response = jsonify({
         manufacturer_name: manufacturer_list
     })
     response.headers.add('Access-Content-Allow-Origin', '*')
     return response
 
-@app.route('/api/estimate-price', methods=['POST'])
+def request_deadline():
+    """
+    Deadline the client asked for with X-Request-Deadline-Ms, in seconds.
+    None if unset or not a positive finite number, e.g. 'nan' or 'inf'.
+    """
+    try:
+        deadline_ms = float(request.headers['X-Request-Deadline-Ms'])
+    except (KeyError, ValueError):
+        return None
+    if not math.isfinite(deadline_ms) or deadline_ms <= 0:
+        return None
+    return deadline_ms / 1000
+
+@api.route('/api/estimate-price', methods=['POST'])
 def predict():
+    arrival = time.monotonic()
     if request.is_json:
         data = request.get_json()
 
-        prediction = utils.predict_used_car_price(**data)
+        try:
+            prediction = get_service().estimate_price(data, deadline=request_deadline(), arrival=arrival)
+        except QueueRejected as e:
+            logger.warning(str(e))
+            response = jsonify({'error': 'Server is overloaded, please retry later'})
+            response.status_code = 503
+            response.headers['Retry-After'] = str(e.retry_after)
+            response.headers.add('Access-Control-Allow-Origin', '*')
+            return response
         
         response = jsonify({
             f'predicted_price': prediction
@@ -60,8 +148,92 @@ def predict():
     else:
         # Handle the case where the Content-Type is not JSON
         return jsonify({'error': 'Invalid content type, please send application/json'}), 400
-    
+
+
+@api.route('/api/estimate-prices', methods=['POST'])
+def predict_batch():
+    """
+    Accepts a JSON array of cars, or NDJSON with one car per line.
+    """
+    try:
+        if request.is_json:
+            data = request.get_json()
+        else:
+            data = [json.loads(line) for line in request.get_data(as_text=True).splitlines() if line.strip()]
+    except ValueError:
+        return jsonify({'error': 'Invalid body, please send a JSON array or NDJSON'}), 400
+
+    if not isinstance(data, list) or not all(isinstance(car, dict) for car in data):
+        return jsonify({'error': 'Invalid body, please send a JSON array or NDJSON'}), 400
+
+    try:
+        predictions = get_service().predict_used_car_prices(data)
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': f'Invalid car fields: {e}'}), 400
+
+    response = jsonify({
+        'predicted_prices': predictions
+    })
+    response.headers.add('Access-Control-Allow-Origin', '*')
+    return response
+
+@api.route('/healthz/live')
+def liveness():
+    return jsonify({'status': 'ok'})
+
+@api.route('/healthz/ready')
+def readiness():
+    """Reports ready only once artifacts are loaded and the model has been warmed up."""
+    if not get_service().is_ready():
+        try:
+            get_service().warmup()
+        except Exception as e:
+            logger.error(f'Artifacts are not ready: {e}')
+            return jsonify({'status': 'unavailable'}), 503
+    return jsonify({'status': 'ready', 'artifacts_version': get_service().registry.get().version})
+
+@api.route('/metrics')
+def metrics():
+    return jsonify(get_service().stats())
+
+
+def build_app(service):
+    """
+    Flask app serving the api blueprint from `service`, which it shares with
+    whoever built it. Nothing is loaded here.
+    """
+    app = Flask(__name__)
+    CORS(app)
+    app.extensions[SERVICE_EXTENSION] = service
+    app.register_blueprint(api)
+    return app
+
+
+def create_app(config=None):
+    """
+    Application factory, with its own PredictionService. Run it under
+    gunicorn as `gunicorn --preload 'src.server.server:create_app()'`.
+
+    With preload_artifacts, artifacts are loaded and checked here, in the
+    gunicorn master, and then moved out of the garbage collector's reach with
+    gc.freeze() so the forked workers keep sharing those pages copy-on-write.
+    """
+    config = config or ServerConfig()
+    service = PredictionService(
+        config.registry, config.prediction_cache, config.inference_queue, config.coalesce_predictions
+    )
+    app = build_app(service)
+
+    if config.preload_artifacts:
+        service.warmup()
+        gc.collect()
+        gc.freeze()
+
+    return app
+
+
 if __name__ == '__main__':
     logger.info('Starting Flask server for used car price prediction...')
-    utils.load_artifacts()
+    app = create_app()
+    app.extensions[SERVICE_EXTENSION].registry.install_reload_signal()
     app.run(host="0.0.0.0", port=8080)
@@ -0,0 +1,69 @@
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """
+    Deduplicates identical work in flight: the first caller for a key
+    computes, and callers arriving with the same key before it finishes wait
+    on its future instead of computing again. Nothing is kept once the
+    result is delivered, so unlike a cache it never serves stale values.
+
+    Futures are concurrent.futures.Future, so threads block on them with
+    result() and event loops can await them through asyncio.wrap_future.
+    """
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def claim(self, key):
+        """
+        Returns (future, leader). The leader must settle the future with
+        resolve(); everyone else waits on it.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = self._calls[key] = Future()
+            self.leaders += 1
+            return future, True
+
+    def resolve(self, key, future, result=None, exception=None):
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+
+    def do(self, key, compute, timeout=None):
+        """
+        Runs compute() unless an identical call is in flight, in which case
+        its result (or exception) is returned after at most `timeout` seconds.
+        """
+        future, leader = self.claim(key)
+        if not leader:
+            return future.result(timeout)
+
+        try:
+            result = compute()
+        except BaseException as e:
+            self.resolve(key, future, exception=e)
+            raise
+        self.resolve(key, future, result)
+        return result
+
+    def stats(self):
+        with self._lock:
+            calls = self.leaders + self.coalesced
+            return {
+                'in_flight': len(self._calls),
+                'leaders': self.leaders,
+                'coalesced': self.coalesced,
+                'coalesced_rate': self.coalesced / calls if calls else 0.0,
+            }
@@ -1,150 +1,213 @@
-import json
-import joblib
+import time
+from collections.abc import Mapping
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
 import numpy as np
-import pandas as pd
-
-# Global variables
-_artifacts = {
-    "manufacturers": None,
-    "models": None,
-    "categories": None,
-    "colors": None,
-    "fuels": None,
-    "gear_boxes": None,
-    "drive_wheels": None,
-    "manufacturers_columns": None,
-    "models_columns": None,
-    "categories_columns": None,
-    "colors_columns": None,
-    "fuel_types_columns": None,
-    "gear_box_types_columns": None,
-    "drive_wheels_columns": None,
-    "data_columns": None,
-    "manufacturers_to_models_columns": None,
-    'scaler': None,
-    "model_xgb": None,
-    "model_rfr": None
+
+from src.registry import ArtifactRegistry, thaw
+from src.server.admission import InferenceQueue, QueueRejected
+from src.server.cache import PredictionCache
+from src.server.singleflight import SingleFlight
+from src.server.lookups import render_lookup_responses
+
+# Built with every artifacts snapshot
+REGISTRY_BUILDERS = {
+    'lookup_responses': render_lookup_responses,
 }
 
-def get_object_keys(obj):
-    load_artifacts()
-    return _artifacts.get(obj, [])
-
-def get_exact_value(col_name, dict_name, key):
-    """Returns the exact value from a nested dictionary, defaults to 0 if the key is not found."""
-    load_artifacts()
-    return _artifacts.get(col_name, {}).get(dict_name, {}).get(key, 0)
-
-def get_manufacturer_models(manufacturer_name):
-    load_artifacts()
-    manufacturer_name = manufacturer_name.upper()
-    return _artifacts['manufacturers_to_models_columns'].get(manufacturer_name, [])
-
-def load_json_artifact(filepath):
-    """Loads a JSON file and returns its contents."""
-    with open(filepath, 'r') as file:
-        return json.load(file)
-
-def load_artifacts():
-    """Loads all necessary artifacts for the model and assigns them to global variables."""
-    global _artifacts
-    
-    # Load JSON artifacts
-    _artifacts['manufacturers_columns'] = load_json_artifact('./artifacts/Manufacturer.json')
-    _artifacts['models_columns'] = load_json_artifact('artifacts/Model.json')
-    _artifacts['categories_columns'] = load_json_artifact('artifacts/Category.json')
-    _artifacts['colors_columns'] = load_json_artifact('artifacts/Color.json')
-    _artifacts['gear_box_types_columns'] = load_json_artifact('artifacts/Gear_box_type.json')
-    _artifacts['fuel_types_columns'] = load_json_artifact('artifacts/Fuel_type.json')
-    _artifacts['drive_wheels_columns'] = load_json_artifact('artifacts/Drive_wheels.json')
-    _artifacts['manufacturers_to_models_columns'] = load_json_artifact('artifacts/manufactures_to_models.json')
-    _artifacts['data_columns'] = load_json_artifact('artifacts/columns.json')['data_columns']
-
-    # Extract specific keys
-    _artifacts['manufacturers'] = list(_artifacts['manufacturers_columns']['Manufacturers'].keys())
-    _artifacts['models'] = list(_artifacts['models_columns']['Models'].keys())
-    _artifacts['categories'] = list(_artifacts['categories_columns']['Categorys'].keys())
-    _artifacts['colors'] = list(_artifacts['colors_columns']['Colors'].keys())
-    _artifacts['gear_boxes'] = list(_artifacts['gear_box_types_columns']['Gear_box_types'].keys())
-    _artifacts['fuels'] = list(_artifacts['fuel_types_columns']['Fuel_types'].keys())
-    _artifacts['drive_wheels'] = list(_artifacts['drive_wheels_columns']['Drive_wheelss'].keys())
-
-    # Load model artifacts
-    _artifacts['scaler'] = joblib.load('./artifacts/mileage_scaler.pkl')
-    _artifacts['model_rfr'] = joblib.load('./artifacts/model.pkl')
-
-
-def predict_used_car_price(**kwargs):
-    """Util function to predict the price of a used car."""
-    load_artifacts()
-    x = np.zeros(len(_artifacts['data_columns']))
-    model_choice = ''
-    for key, value in kwargs.items():
-
-        if type(value) == str:
-            value = value.title()
-        
-        if key == 'levy':
-            x[0] = value
-        
-        elif key == 'manufacturer':
-            x[1] = get_exact_value('manufacturers_columns', 'Manufacturers', value)
-        
-        elif key == 'model':
-            x[2] = get_exact_value('models_columns', 'Models', value)
-        
-        elif key == 'prod_year':
-            x[3] = value
-        
-        elif key == 'category':
-            x[4] = get_exact_value('categories_columns', 'Categorys', value)
-        
-        elif key == 'interior':
-            x[5] = 1 if value == 'Leather' else 0
-        
-        elif key == 'fuel_type':
-            x[6] = get_exact_value('fuel_types_columns', 'Fuel_types', value)
-        
-        elif key == 'engine_volume':
-            x[7] = value
-        
-        elif key == 'mileage':
-            mileage_df = pd.DataFrame([[value]], columns=['Mileage'])
-            x[8] = _artifacts['scaler'].transform(mileage_df)[0][0]
-        
-        elif key == 'cylinder':
-            x[9] = value
-        
-        elif key == 'gear_box_type':
-            x[10] = get_exact_value('gear_box_types_columns', 'Gear_box_types', value)
-        
-        elif key == 'drive_wheel':
-            x[11] = get_exact_value('drive_wheels_columns', 'Drive_wheelss', value)
-        
-        elif key == 'color':
-            x[12] = get_exact_value('colors_columns', 'Colors', value)
-        
-        elif key == 'airbag':
-            x[13] = value
-
-        elif key == 'model_choice':
-            model_choice = 'model_rfr'
-    
-    x_df = pd.DataFrame([x], columns=_artifacts['data_columns'])
-    print(f"Predicting with RandomForestRegressor: {model_choice == 'model_rfr'}")
-    predicted_price = int(_artifacts[model_choice].predict(x_df)[0])
-    return predicted_price
+BATCH_CHUNK_SIZE = 10000
+
+
+def _lookup_value(snapshot, col_name, dict_name, key):
+    return snapshot.get(col_name, {}).get(dict_name, {}).get(key, 0)
+
+
+class PredictionService:
+    """
+    The state one app serves from: artifacts loaded on first use and swapped
+    atomically on reload, the prediction cache, the inference queue and the
+    predictions in flight. Each app gets its own, so several apps can live
+    in one process without sharing or replacing each other's state.
+    """
+    def __init__(self, registry_config=None, prediction_cache_config=None,
+                 inference_queue_config=None, coalesce_predictions=True):
+        self.registry = ArtifactRegistry(registry_config, builders=REGISTRY_BUILDERS)
+        # Predictions keyed by encoded feature vector, emptied when the artifacts change
+        self.prediction_cache = PredictionCache(prediction_cache_config)
+        # Bounded admission of single-car predictions, shedding load past its depth or deadlines
+        self.inference_queue = InferenceQueue(inference_queue_config)
+        # Predictions in flight keyed by artifacts version and encoded feature
+        # vector, so identical concurrent requests share one. None disables it.
+        self.in_flight = SingleFlight() if coalesce_predictions else None
+        # Artifact version that went through warmup(), None until then
+        self._warm_version = None
+
+    def get_object_keys(self, obj):
+        objects = self.registry.get().get(obj, [])
+        return thaw(objects) if isinstance(objects, Mapping) else objects
+
+    def get_exact_value(self, col_name, dict_name, key):
+        """Returns the exact value from a nested dictionary, defaults to 0 if the key is not found."""
+        return _lookup_value(self.registry.get(), col_name, dict_name, key)
+
+    def get_manufacturer_models(self, manufacturer_name):
+        snapshot = self.registry.get()
+        manufacturer_name = snapshot['manufacturers_index'].resolve(manufacturer_name)
+        return snapshot['manufacturers_to_models_columns'].get(manufacturer_name, [])
+
+    def get_lookup_response(self, kind, key):
+        """
+        Pre-rendered response of a lookup endpoint: kind is 'objects',
+        'manufacturers' or 'values'. None when it was not pre-rendered.
+        """
+        return self.registry.get()['lookup_responses'][kind].get(key)
+
+    def load_artifacts(self):
+        """Loads all necessary artifacts for the model and swaps them into the registry."""
+        return self.registry.reload()
+
+    def warmup(self):
+        """Loads the artifacts and runs one prediction through the encoder and model."""
+        snapshot = self.registry.get()
+        x = snapshot['encoder'].encode({})
+        snapshot['model_rfr'].predict(x.reshape(1, -1))
+        self._warm_version = snapshot.version
+        return snapshot
+
+    def is_ready(self):
+        return self._warm_version is not None
+
+    def stats(self):
+        return {
+            'prediction_cache': self.prediction_cache.stats(),
+            'inference_queue': self.inference_queue.stats(),
+            'single_flight': self.in_flight.stats() if self.in_flight is not None else None
+        }
+
+    def predict_used_car_price(self, **kwargs):
+        """Util function to predict the price of a used car."""
+        return self.estimate_price(kwargs)
+
+    def estimate_price(self, record, deadline=None, arrival=None):
+        """
+        Predicts the price of one car. On a cache miss, concurrent requests for
+        the same encoded car wait for the first one's prediction, which goes
+        through the inference queue. Raises QueueRejected when the price cannot
+        be had within `deadline` seconds of `arrival` (time.monotonic()).
+        """
+        arrival = time.monotonic() if arrival is None else arrival
+        snapshot = self.registry.get()
+        encoder = snapshot['encoder']
+        cache = self.prediction_cache
+        inference_queue = self.inference_queue
+        x = encoder.encode(cache.bucket_mileage(record))
+        # The forest is the only model served, as in the batch endpoint
+        model_choice = 'model_rfr'
+        model = snapshot[model_choice]
+        key = (model_choice, cache.key(x))
+
+        if cache.enabled:
+            predicted_price = cache.get(snapshot.version, key)
+            if predicted_price is not None:
+                return predicted_price
+
+        def predict():
+            predicted_price = inference_queue.run(
+                lambda: int(model.predict(x.reshape(1, -1))[0]), deadline=deadline, arrival=arrival
+            )
+            if cache.enabled:
+                cache.put(snapshot.version, key, predicted_price)
+            return predicted_price
+
+        flights = self.in_flight
+        if flights is None:
+            return predict()
+        try:
+            timeout = inference_queue.expires_at(deadline, arrival) - time.monotonic()
+            return flights.do((snapshot.version, *key), predict, timeout=timeout)
+        except FutureTimeoutError:
+            raise QueueRejected('deadline expired waiting for an identical prediction', inference_queue.retry_after())
+
+    def predict_used_car_prices(self, records, chunk_size=BATCH_CHUNK_SIZE, use_cache=False, coalesce=False):
+        """
+        Util function to predict the prices of many used cars at once. With
+        use_cache, rows already in the prediction cache skip the model; leave it
+        off for bulk jobs so they do not evict the popular entries. With
+        coalesce, identical cars are predicted once, including cars being
+        predicted by concurrent requests, which are waited for instead.
+        """
+        snapshot = self.registry.get()
+        encoder = snapshot['encoder']
+        model = snapshot['model_rfr']
+        cache = self.prediction_cache
+        use_cache = use_cache and cache.enabled
+        flights = self.in_flight if coalesce else None
+
+        x = encoder.encode_batch([cache.bucket_mileage(record) for record in records])
+        predicted_prices = np.empty(len(x))
+        if use_cache or flights is not None:
+            keys = [('model_rfr', cache.key(row)) for row in x]
+
+        if use_cache:
+            cached = [cache.get(snapshot.version, key) for key in keys]
+            missing = np.array([price is None for price in cached], dtype=bool)
+            predicted_prices[~missing] = [price for price in cached if price is not None]
+            rows = np.flatnonzero(missing)
+        else:
+            rows = np.arange(len(x))
+
+        # Key -> (future, leader, first row with that key). Only the first row
+        # of each key led here is sent to the model.
+        claims = {}
+        if flights is not None:
+            for row in rows:
+                if keys[row] not in claims:
+                    claims[keys[row]] = (*flights.claim((snapshot.version, *keys[row])), row)
+            model_rows = np.array([row for _, leader, row in claims.values() if leader], dtype=np.intp)
+        else:
+            model_rows = rows
+
+        try:
+            for start in range(0, len(model_rows), chunk_size):
+                chunk = model_rows[start:start + chunk_size]
+                predicted_prices[chunk] = model.predict(x[chunk])
+        except BaseException as e:
+            for key, (future, leader, _) in claims.items():
+                if leader:
+                    flights.resolve((snapshot.version, *key), future, exception=e)
+            raise
+
+        # Settle the futures led here before waiting on any other request's,
+        # so two batches leading each other's cars never wait on each other
+        for key, (future, leader, row) in claims.items():
+            if leader:
+                flights.resolve((snapshot.version, *key), future, int(predicted_prices[row]))
+        if flights is not None:
+            for row in rows:
+                future, leader, first_row = claims[keys[row]]
+                if leader:
+                    predicted_prices[row] = predicted_prices[first_row]
+                    continue
+                try:
+                    predicted_prices[row] = future.result()
+                except Exception:
+                    # The request leading this car failed, e.g. it was shed
+                    predicted_prices[row] = model.predict(x[[row]])[0]
+
+        predicted_prices = predicted_prices.astype(int).tolist()
+        if use_cache:
+            for row in rows:
+                cache.put(snapshot.version, keys[row], predicted_prices[row])
+        return predicted_prices
 
 
 if __name__ == '__main__':
-    load_artifacts()
-    print(get_object_keys('colors'))
-    # print(_artifacts['colors_columns'])
-    print(get_exact_value('gear_box_types_columns', 'Gear_box_types','Automatic'))
-    # print(get_manufacturer_models('acura'))
-    # print('>>>>>>>>>>>....', _artifacts['colors'])
-    # print(_artifacts['manufacturers'])
-    print(predict_used_car_price(
+    service = PredictionService()
+    service.load_artifacts()
+    print(service.get_object_keys('colors'))
+    print(service.get_exact_value('gear_box_types_columns', 'Gear_box_types','Automatic'))
+    # print(service.get_manufacturer_models('acura'))
+    print(service.predict_used_car_price(
         levy=1234,
         manufacturer='HonDa', 
         model='Civic', 
@@ -0,0 +1,7 @@
+from src.server.server import create_app
+
+# WSGI entry point for servers that import an application object, e.g.
+# Elastic Beanstalk. Importing this module loads and warms up the artifacts;
+# src.server.server itself has no import-time side effects.
+application = create_app()
+app = application
@@ -0,0 +1,68 @@
+import numpy as np
+
+
+class QuantileSketch:
+    """
+    Streaming quantile estimator (a merging t-digest) for data that does not
+    fit in memory. Values are added a chunk at a time and kept as at most
+    ~`compression / 2` weighted centroids, which are smallest near the tails so
+    quantiles like 0.05 and 0.95 stay accurate. Centroids also track the range
+    of values they absorbed, so runs of equal values, common in prices and
+    mileages, give exact quantiles.
+
+    Until more than `compression` values have been added, quantile() matches
+    pandas' linear interpolation exactly.
+    """
+    def __init__(self, compression=1000):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.mins = np.empty(0)
+        self.maxs = np.empty(0)
+        self.count = 0
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return self
+        self.count += len(values)
+
+        means = np.concatenate([self.means, values])
+        order = np.argsort(means, kind='stable')
+        means = means[order]
+        weights = np.concatenate([self.weights, np.ones(len(values))])[order]
+        mins = np.concatenate([self.mins, values])[order]
+        maxs = np.concatenate([self.maxs, values])[order]
+
+        if len(means) <= self.compression:
+            self.means, self.weights, self.mins, self.maxs = means, weights, mins, maxs
+            return self
+
+        # Centroids falling in the same unit of the k1 scale function
+        # k(q) = compression / 2pi * asin(2q - 1) are merged together
+        midpoints = (np.cumsum(weights) - weights / 2) / self.count
+        k = self.compression / (2 * np.pi) * np.arcsin(2 * midpoints - 1)
+        starts = np.flatnonzero(np.diff(np.floor(k), prepend=-np.inf))
+
+        self.weights = np.add.reduceat(weights, starts)
+        self.mins = np.minimum.reduceat(mins, starts)
+        self.maxs = np.maximum.reduceat(maxs, starts)
+        self.means = np.clip(np.add.reduceat(means * weights, starts) / self.weights, self.mins, self.maxs)
+        return self
+
+    def quantile(self, q):
+        """Estimated quantile(s) of everything added so far, NaN when empty."""
+        q = np.asarray(q, dtype=np.float64)
+        if not self.count:
+            return np.full(q.shape, np.nan)
+
+        # Centroids are placed at their mean rank, except that a centroid of
+        # equal values holds its value across every rank it absorbed
+        ends = np.cumsum(self.weights) - 0.5
+        starts = ends - self.weights + 1
+        centres = (starts + ends) / 2
+        constant = self.mins == self.maxs
+        ranks = np.column_stack([np.where(constant, starts, centres), centres, np.where(constant, ends, centres)]).ravel()
+        values = np.repeat(self.means, 3)
+        return np.interp(q * (self.count - 1) + 0.5, ranks, values)
@@ -2,12 +2,19 @@ import pickle
 import os
 import sys
 import json
+from contextlib import nullcontext
 
 import pandas as pd
 import numpy as np
 
+from joblib import Parallel, delayed, parallel_config
+from threadpoolctl import threadpool_limits
+from sklearn.base import clone
 from sklearn.metrics import r2_score
-from sklearn.model_selection import GridSearchCV, ShuffleSplit, cross_val_score
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.model_selection import (
+    GridSearchCV, HalvingGridSearchCV, ShuffleSplit, cross_val_score, train_test_split
+)
 from sklearn.metrics import mean_absolute_error
 
 from src.exception import CustomException
@@ -25,28 +32,145 @@ def save_object(file_path, obj):
     except Exception as e:
         raise CustomException(e, sys)
     
-def evaluate_models(X, y, model_params):
+def get_parallel_budget(n_jobs, n_tasks):
+    """
+    Splits `n_jobs` cores (None or negative counts from os.cpu_count(), as in
+    joblib) between `n_tasks` concurrent tasks and the jobs inside each task.
+    Returns (outer_jobs, inner_jobs).
+    """
+    cpu_count = os.cpu_count() or 1
+    if n_jobs is None:
+        total = cpu_count
+    elif n_jobs < 0:
+        total = max(1, cpu_count + 1 + n_jobs)
+    else:
+        total = max(1, n_jobs)
+
+    outer_jobs = max(1, min(n_tasks, total))
+    inner_jobs = max(1, total // outer_jobs)
+    return outer_jobs, inner_jobs
+
+
+def _grid_search_cv(estimator, mp, cv, n_jobs):
+    return GridSearchCV(estimator, mp['params'], cv=cv, return_train_score=False, n_jobs=n_jobs)
+
+
+def _halving_search_cv(estimator, mp, cv, n_jobs):
+    """
+    Successive halving: every candidate starts on a small budget of
+    `resource` (rows by default, or e.g. n_estimators) and only the best
+    1/factor move on to the next, larger budget. Uses the model's 'halving'
+    entry (params, resource, max_resources, ...) when it has one.
+    """
+    halving = mp.get('halving', {})
+    return HalvingGridSearchCV(
+        estimator,
+        halving.get('params', mp['params']),
+        cv=cv,
+        factor=halving.get('factor', 3),
+        resource=halving.get('resource', 'n_samples'),
+        max_resources=halving.get('max_resources', 'auto'),
+        min_resources=halving.get('min_resources', 'exhaust'),
+        return_train_score=False,
+        n_jobs=n_jobs,
+        random_state=42
+    )
+
+
+# Search strategy name -> build(estimator, model params entry, cv, n_jobs)
+SEARCH_STRATEGIES = {
+    'grid': _grid_search_cv,
+    'halving': _halving_search_cv,
+}
+
+
+def _search_model(model_name, mp, X, y, cv, n_jobs, limit_threads, strategy):
+    estimator = clone(mp['model'])
+    # The CV jobs already use every core of this model's share
+    pinned_jobs = 'n_jobs' in estimator.get_params() and 'n_jobs' not in mp['params']
+    if pinned_jobs:
+        estimator.set_params(n_jobs=1)
+
+    # Early stopping (XGBoost) watches a slice of the data kept out of the search
+    fit_params = {}
+    early_stopping_rounds = mp.get(strategy, {}).get('early_stopping_rounds')
+    if early_stopping_rounds and 'early_stopping_rounds' in estimator.get_params():
+        X, X_es, y, y_es = train_test_split(X, y, test_size=0.1, random_state=42)
+        estimator.set_params(early_stopping_rounds=early_stopping_rounds)
+        fit_params = {'eval_set': [(X_es, y_es)], 'verbose': False}
+
+    # Worker processes do not inherit the parent's thread limits
+    limits = threadpool_limits(limits=1) if limit_threads else nullcontext()
+    with limits, parallel_config(backend='threading'):
+        gs = SEARCH_STRATEGIES[strategy](estimator, mp, cv, n_jobs)
+        gs.fit(X, y, **fit_params)
+
+    best_estimator = None if fit_params else gs.best_estimator_
+    if best_estimator is not None and pinned_jobs:
+        # The refit model is saved as is, so give it back its own n_jobs
+        best_estimator.set_params(n_jobs=mp['model'].get_params()['n_jobs'])
+
+    best_params = dict(gs.best_params_)
+    if fit_params:
+        # Report the stopping point so the model can be refit without early stopping
+        best_params['n_estimators'] = int(gs.best_estimator_.best_iteration) + 1
+
+    # Test scores of the best candidate on each CV split of the search
+    n_splits = sum(key.startswith('split') and key.endswith('_test_score') for key in gs.cv_results_)
+    cv_scores = [gs.cv_results_[f'split{i}_test_score'][gs.best_index_] for i in range(n_splits)]
+
+    logging.info(f"{strategy} search for {model_name} done, best score {gs.best_score_:.4f}")
+    return {
+        'model_name': model_name,
+        'best_params': best_params,
+        'best_score': gs.best_score_,
+        # Already refit on all of X by the search, unless early stopping held data back
+        'best_estimator': best_estimator,
+        'cv_scores': cv_scores
+    }
+
+
+def evaluate_models(X, y, model_params, n_jobs=-1, backend='loky', strategy='grid', return_estimators=False):
+    """
+    Searches every model in `model_params` concurrently with the given
+    search `strategy` (a key of SEARCH_STRATEGIES). The `n_jobs` core budget
+    is split between the models, run on `backend` ('loky' processes or
+    'threading'), and the CV fits inside each search, run on threads since
+    the tree learners release the GIL. BLAS/OpenMP pools are capped at one
+    thread per fit so the two levels never oversubscribe the machine.
+
+    With return_estimators, also returns {model_name: {'best_estimator',
+    'cv_scores'}} so callers can reuse the search's refit model and fold
+    scores instead of training again.
+    """
     try:
-        scores = []
         cv = ShuffleSplit(n_splits=5, test_size=0.2, random_state=42)
-        for model_name, mp in model_params.items():
-            gs = GridSearchCV(mp['model'], mp['params'], cv=cv, return_train_score=False)
-            gs.fit(X, y)
-            scores.append({
-                'model_name': model_name,
-                'best_params': gs.best_params_,
-                'best_score': gs.best_score_
-            })
+        outer_jobs, inner_jobs = get_parallel_budget(n_jobs, len(model_params))
+        logging.info(f"Evaluating {len(model_params)} models, {outer_jobs} at a time with {inner_jobs} jobs each")
+
+        with threadpool_limits(limits=1):
+            scores = Parallel(n_jobs=outer_jobs, backend=backend)(
+                delayed(_search_model)(model_name, mp, X, y, cv, inner_jobs, backend != 'threading', strategy)
+                for model_name, mp in model_params.items()
+            )
+
         best_model = pd.DataFrame(scores, columns=['model_name', 'best_params', 'best_score'])
+        if return_estimators:
+            estimators = {
+                score['model_name']: {key: score[key] for key in ('best_estimator', 'cv_scores')}
+                for score in scores
+            }
+            return best_model, estimators
         return best_model
 
     except Exception as e:
         raise CustomException(e, sys)
     
 
-def train_test_cross_validate(model, X_train, y_train, X_test, y_test, cv):
+def train_test_cross_validate(model, X_train, y_train, X_test, y_test, cv, refit=True):
     try:
-        model.fit(X_train, y_train)
+        if refit:
+            model.fit(X_train, y_train)
         model_score = model.score(X_test, y_test)
         
         # Train pred
@@ -95,15 +219,15 @@ def load_json_object(file_path):
         raise CustomException(e, sys)
 
 
-def get_value_from_dict(value, dictionary, default_mean=True):
+def compute_fallback(dictionary, strategy='mean'):
     """
-    Helper function to get a value from a dictionary.
-    If the value is not found, it returns the mean of the dictionary values.
+    Value used for keys missing from an encoding dictionary: the mean or the
+    median of its values, or `strategy` itself when it is a number.
+    Meant to be computed once when the dictionary is loaded.
     """
-    value = value.title()
-    result = dictionary.get(value, None)
-    
-    if result is None and default_mean:
-        result = np.mean(list(dictionary.values()))
-        
-    return result
\ No newline at end of file
+    if strategy == 'mean':
+        return float(np.mean(list(dictionary.values())))
+    if strategy == 'median':
+        return float(np.median(list(dictionary.values())))
+    return float(strategy)
+
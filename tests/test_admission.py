@@ -0,0 +1,103 @@
+import threading
+import time
+
+import pytest
+
+from src.server.admission import InferenceQueue, InferenceQueueConfig, QueueRejected
+from src.server.server import build_app
+from src.server.utils import PredictionService
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, 'condition not reached'
+        time.sleep(0.001)
+
+
+class HeldPrediction:
+    """A prediction occupying a worker until release() is called."""
+    def __init__(self, queue, deadline=None):
+        self.released = threading.Event()
+        self.thread = threading.Thread(target=queue.run, args=(self.released.wait,), kwargs={'deadline': deadline})
+        self.thread.start()
+
+    def release(self):
+        self.released.set()
+        self.thread.join()
+
+
+def test_rejects_when_queue_is_full():
+    queue = InferenceQueue(InferenceQueueConfig(workers=1, max_queue_depth=1, deadline_seconds=10))
+    running = HeldPrediction(queue)
+    wait_until(lambda: queue.stats()['running'] == 1)
+    queued = HeldPrediction(queue)
+    wait_until(lambda: queue.stats()['queue_depth'] == 1)
+
+    with pytest.raises(QueueRejected) as rejected:
+        queue.run(lambda: 1)
+    assert rejected.value.reason == 'queue full'
+
+    running.release()
+    queued.release()
+    stats = queue.stats()
+    assert stats['rejected'] == {'queue_full': 1, 'deadline': 0, 'timeout': 0}
+    assert stats['completed'] == 2
+
+
+def test_rejects_on_arrival_when_deadline_cannot_be_met():
+    queue = InferenceQueue(InferenceQueueConfig(workers=1, deadline_seconds=10))
+    queue.run(lambda: time.sleep(0.05))
+
+    predictions = []
+    with pytest.raises(QueueRejected) as rejected:
+        queue.run(lambda: predictions.append(1), deadline=0.01)
+    assert rejected.value.reason == 'deadline cannot be met'
+    assert predictions == []
+    assert queue.stats()['rejected']['deadline'] == 1
+
+
+def test_rejects_when_deadline_expires_while_queued():
+    queue = InferenceQueue(InferenceQueueConfig(workers=1, deadline_seconds=10))
+    running = HeldPrediction(queue)
+    wait_until(lambda: queue.stats()['running'] == 1)
+
+    with pytest.raises(QueueRejected) as rejected:
+        queue.run(lambda: 1, deadline=0.05)
+    assert rejected.value.reason == 'deadline expired while queued'
+
+    running.release()
+    stats = queue.stats()
+    assert stats['rejected']['timeout'] == 1
+    assert stats['queue_depth'] == 0
+
+
+def test_retry_after_covers_the_backlog():
+    queue = InferenceQueue(InferenceQueueConfig(workers=1, max_queue_depth=1, deadline_seconds=10, retry_after_seconds=3))
+    running = HeldPrediction(queue)
+    wait_until(lambda: queue.stats()['running'] == 1)
+    queued = HeldPrediction(queue)
+    wait_until(lambda: queue.stats()['queue_depth'] == 1)
+    with pytest.raises(QueueRejected) as rejected:
+        queue.run(lambda: 1)
+    # No prediction has finished yet, so the backlog's length is unknown
+    assert rejected.value.retry_after == 3
+    running.release()
+    queued.release()
+
+    # Four predictions of two seconds each ahead, on one worker
+    queue._service_time = 2.0
+    queue._running = 4
+    assert queue.retry_after() == 8
+
+
+def test_rejection_is_a_503_with_retry_after():
+    service = PredictionService()
+
+    def estimate_price(record, deadline=None, arrival=None):
+        raise QueueRejected('queue full', 7)
+    service.estimate_price = estimate_price
+
+    response = build_app(service).test_client().post('/api/estimate-price', json={'levy': 1000})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '7'
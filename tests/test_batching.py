@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+
+from src.server.batching import MicroBatchConfig, MicroBatcher
+
+
+class StubBatchPredictor:
+    """Prices cars by their levy, rejecting the whole batch if any car has none."""
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, records):
+        self.batches.append(len(records))
+        if any('levy' not in record for record in records):
+            raise ValueError('levy is required')
+        return [record['levy'] * 2 for record in records]
+
+
+def submit_all(predictor, records, **config):
+    async def main():
+        batcher = MicroBatcher(predictor, MicroBatchConfig(**config))
+        try:
+            return await asyncio.gather(*(batcher.submit(record) for record in records), return_exceptions=True)
+        finally:
+            batcher.shutdown()
+    return asyncio.run(main())
+
+
+def test_concurrent_cars_share_one_batch():
+    predictor = StubBatchPredictor()
+    results = submit_all(predictor, [{'levy': levy} for levy in (1, 2, 3)], max_batch_size=3, max_wait_ms=1000)
+    assert results == [2, 4, 6]
+    assert predictor.batches == [3]
+
+
+def test_batch_flushes_after_max_wait():
+    predictor = StubBatchPredictor()
+    results = submit_all(predictor, [{'levy': 5}], max_batch_size=64, max_wait_ms=1)
+    assert results == [10]
+    assert predictor.batches == [1]
+
+
+def test_failed_batch_falls_back_to_each_car():
+    predictor = StubBatchPredictor()
+    results = submit_all(predictor, [{'levy': 1}, {}, {'levy': 3}], max_batch_size=3, max_wait_ms=1000)
+    assert results[0] == 2 and results[2] == 6
+    assert isinstance(results[1], ValueError)
+    assert predictor.batches == [3, 1, 1, 1]
@@ -0,0 +1,22 @@
+import os
+
+import pandas as pd
+import pandas.testing as pdt
+
+from src.components.data_ingestion import DataIngestion, DataIngestionConfig, clean_raw_data
+
+
+SOURCE_DATA_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src', 'notebook', 'data', 'car_price_prediction.csv'
+)
+
+
+def test_small_chunks_parse_like_the_whole_file():
+    # Most 50-row chunks have no 'Turbo' engine, nor a '-' levy
+    config = DataIngestionConfig(source_data_path=SOURCE_DATA_PATH, chunk_size=50)
+    chunks = list(DataIngestion(config)._raw_chunks())
+    assert len(chunks) > 1
+
+    # Read whole, the text columns hold some non-numbers and infer as text
+    expected = clean_raw_data(pd.read_csv(SOURCE_DATA_PATH))
+    pdt.assert_frame_equal(pd.concat(chunks), expected)
@@ -0,0 +1,130 @@
+import copy
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+
+from src.encoder import CATEGORY_FIELDS, CategoryIndex, FeatureEncoder, MILEAGE_FIELD, NUMERIC_FIELDS
+from src.utils import load_json_object
+
+
+ARTIFACTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'artifacts')
+
+
+def legacy_vector(record, data_columns, category_dicts, scaler):
+    # The DataFrame + StandardScaler encoding the encoder replaced
+    x = np.zeros(len(data_columns))
+    for key, value in record.items():
+        if key in CATEGORY_FIELDS:
+            x[data_columns.index(CATEGORY_FIELDS[key][0])] = category_dicts[key].get(value, 0)
+        elif key in NUMERIC_FIELDS:
+            x[data_columns.index(NUMERIC_FIELDS[key])] = value
+        elif key == 'interior':
+            x[data_columns.index('Leather_interior')] = 1 if value == 'Leather' else 0
+        elif key == MILEAGE_FIELD:
+            mileage_df = pd.DataFrame([[value]], columns=['Mileage'])
+            x[data_columns.index('Mileage')] = scaler.transform(mileage_df)[0][0]
+    return x
+
+
+@pytest.fixture(scope='module')
+def artifacts():
+    data_columns = load_json_object(os.path.join(ARTIFACTS_DIR, 'columns.json'))['data_columns']
+    category_dicts = {
+        field: load_json_object(os.path.join(ARTIFACTS_DIR, file_name))[dict_name]
+        for field, (_, file_name, dict_name) in CATEGORY_FIELDS.items()
+    }
+    scaler = joblib.load(os.path.join(ARTIFACTS_DIR, 'mileage_scaler.pkl'))
+    encoder = FeatureEncoder(data_columns, category_dicts, scaler)
+    return data_columns, category_dicts, scaler, encoder
+
+
+@pytest.fixture(scope='module')
+def records(artifacts):
+    """test.csv rows as request dicts, categories decoded back to their names."""
+    _, category_dicts, _, _ = artifacts
+    test_df = pd.read_csv(os.path.join(ARTIFACTS_DIR, 'test.csv'))
+    names = {field: {code: name for name, code in lookup.items()} for field, lookup in category_dicts.items()}
+
+    records = []
+    for row in test_df.to_dict('records'):
+        record = {field: row[column] for field, column in NUMERIC_FIELDS.items()}
+        record[MILEAGE_FIELD] = row['Mileage']
+        record['interior'] = 'Leather' if row['Leather_interior'] == 'Yes' else 'Cloth'
+        for field, (column, _, _) in CATEGORY_FIELDS.items():
+            if row[column] in names[field]:
+                record[field] = names[field][row[column]]
+        records.append(record)
+
+    # Keys differing only in case or punctuation ('Golf Gti', 'Golf GTI')
+    # share one code on purpose, so their rows cannot match exact lookups
+    indexes = {field: CategoryIndex(lookup) for field, lookup in category_dicts.items()}
+    return [
+        record for record in records
+        if all(indexes[field].resolve(record[field]) == category_dicts[field][record[field]]
+               for field in CATEGORY_FIELDS if field in record)
+    ]
+
+
+@pytest.fixture(scope='module')
+def model(artifacts):
+    data_columns, _, scaler, _ = artifacts
+    train_df = pd.read_csv(os.path.join(ARTIFACTS_DIR, 'train.csv'))
+    X = train_df[data_columns].copy()
+    X['Leather_interior'] = (X['Leather_interior'] == 'Yes').astype(int)
+    X['Mileage'] = scaler.transform(X[['Mileage']])[:, 0]
+    return RandomForestRegressor(n_estimators=10, max_depth=10, random_state=0).fit(X, train_df['Price'])
+
+
+def test_encode_matches_legacy_encoding(artifacts, records):
+    data_columns, category_dicts, scaler, encoder = artifacts
+    assert len(records) > 2000
+    for record in records:
+        expected = legacy_vector(record, data_columns, category_dicts, scaler)
+        np.testing.assert_array_equal(encoder.encode(record), expected.astype(np.float32))
+
+
+def test_predictions_match_legacy_path(artifacts, records, model):
+    data_columns, category_dicts, scaler, encoder = artifacts
+    bound = encoder.bind_model(copy.deepcopy(model))
+    # One-row DataFrame predictions are slow, a sample is enough
+    records = records[:500]
+
+    expected = [
+        model.predict(pd.DataFrame([legacy_vector(record, data_columns, category_dicts, scaler)], columns=data_columns))[0]
+        for record in records
+    ]
+    single = [bound.predict(encoder.encode(record).reshape(1, -1))[0] for record in records]
+    batch = bound.predict(encoder.encode_batch(records))
+
+    np.testing.assert_array_equal(single, expected)
+    np.testing.assert_array_equal(batch, expected)
+
+
+def test_encode_batch_matches_encode(artifacts, records):
+    encoder = artifacts[3]
+    partial = [
+        {'manufacturer': 'honda', 'mileage': 1000},
+        {'model': 'Unknown model', 'levy': 500},
+        {},
+        {'levy': None, 'mileage': None, 'manufacturer': None, 'interior': None},
+        {'levy': np.nan, 'mileage': float('nan'), 'model': np.nan, 'prod_year': 2010},
+    ]
+    cars = records[:200] + partial
+    np.testing.assert_array_equal(encoder.encode_batch(cars), np.stack([encoder.encode(car) for car in cars]))
+    # Null fields encode as if absent
+    np.testing.assert_array_equal(encoder.encode(partial[3]), encoder.encode({}))
+
+
+def test_bind_model_rejects_mismatched_columns(artifacts, model):
+    data_columns, _, _, encoder = artifacts
+    reordered = copy.deepcopy(model)
+    reordered.feature_names_in_ = np.array(data_columns[::-1], dtype=object)
+    with pytest.raises(ValueError):
+        encoder.bind_model(reordered)
+
+    bound = encoder.bind_model(copy.deepcopy(model))
+    assert not hasattr(bound, 'feature_names_in_')
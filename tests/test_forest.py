@@ -0,0 +1,121 @@
+import pickle
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import ExtraTreesRegressor, RandomForestRegressor
+from sklearn.linear_model import LinearRegression, Ridge
+
+from src.forest import (
+    SCALAR_MAX_ROWS, FlatBoostedTrees, FlatForest, FlatLinearModel, compile_model, load_model, verify_engine,
+)
+
+
+COLUMNS = [f'f{i}' for i in range(6)]
+
+# Models are fitted on DataFrames and compared on arrays, as in serving
+pytestmark = pytest.mark.filterwarnings('ignore:X does not have valid feature names')
+
+
+@pytest.fixture(scope='module')
+def data():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(600, len(COLUMNS))).astype(np.float32)
+    X[:, 2] = rng.integers(0, 5, len(X))
+    y = 3 * X[:, 0] + np.sin(X[:, 1]) * 10 + X[:, 2] ** 2 + rng.normal(size=len(X)) + 50
+    return pd.DataFrame(X, columns=COLUMNS), y
+
+
+def assert_same_predictions(engine, model, X):
+    # Both the row-by-row path and the vectorized traversal
+    X = np.asarray(X, dtype=np.float32)
+    for rows in (X[:1], X[:SCALAR_MAX_ROWS], X[:SCALAR_MAX_ROWS + 1], X[:100], X):
+        np.testing.assert_array_equal(engine.predict(rows), model.predict(rows))
+
+
+@pytest.mark.parametrize('model_class', [RandomForestRegressor, ExtraTreesRegressor])
+def test_forest_matches_sklearn(data, model_class):
+    X, y = data
+    model = model_class(n_estimators=20, max_depth=12, random_state=0).fit(X, y)
+    engine = compile_model(model)
+    assert isinstance(engine, FlatForest)
+    assert_same_predictions(engine, model, X)
+
+    # Without the fitted model to hand large batches to
+    standalone = FlatForest.from_model(model)
+    assert_same_predictions(standalone, model, X)
+    X32 = X.to_numpy(np.float32)
+    np.testing.assert_array_equal(standalone.combine(standalone.leaf_values(X32)), model.predict(X32))
+
+
+def test_forest_routes_nan_like_sklearn(data):
+    X, y = data
+    X_nan = X.copy()
+    X_nan.iloc[::5, 0] = np.nan
+    X_nan.iloc[::7, 2] = np.nan
+    # NaN seen in training, and NaN only at prediction time
+    for X_fit in (X_nan, X):
+        model = RandomForestRegressor(n_estimators=20, max_depth=12, random_state=0).fit(X_fit, y)
+        assert_same_predictions(compile_model(model), model, X_nan)
+        assert_same_predictions(FlatForest.from_model(model), model, X_nan)
+
+
+def test_forest_export_round_trip(data, tmp_path):
+    X, y = data
+    model = RandomForestRegressor(n_estimators=10, random_state=0).fit(X, y)
+    FlatForest.from_model(model).save(str(tmp_path))
+    loaded = FlatForest.load(str(tmp_path), mmap_mode='r')
+    assert list(loaded.feature_names_in_) == COLUMNS
+    assert verify_engine(loaded, model, X)
+
+
+def pickle_dump(model, path):
+    with open(path, 'wb') as file:
+        pickle.dump(model, file)
+
+
+@pytest.mark.parametrize('dump', [joblib.dump, pickle_dump])
+def test_load_model_reads_joblib_and_pickle_files(data, tmp_path, dump):
+    X, y = data
+    model = RandomForestRegressor(n_estimators=5, random_state=0).fit(X, y)
+    model_path = str(tmp_path / 'model.pkl')
+    dump(model, model_path)
+    assert_same_predictions(load_model(model_path), model, X)
+
+
+def test_xgboost_matches_booster(data):
+    xgboost = pytest.importorskip('xgboost')
+    X, y = data
+    X = X.copy()
+    X.iloc[::7, 3] = np.nan
+    model = xgboost.XGBRegressor(objective='reg:squarederror', n_estimators=60, max_depth=5).fit(X, y)
+    engine = compile_model(model)
+    assert isinstance(engine, FlatBoostedTrees)
+    assert_same_predictions(engine, model, X)
+
+
+def test_xgboost_stops_at_best_iteration(data):
+    xgboost = pytest.importorskip('xgboost')
+    X, y = data
+    model = xgboost.XGBRegressor(objective='reg:squarederror', n_estimators=500, early_stopping_rounds=5)
+    model.fit(X[:500], y[:500], eval_set=[(X[500:], y[500:])], verbose=False)
+    engine = compile_model(model)
+    assert engine.n_estimators == model.best_iteration + 1
+    assert_same_predictions(engine, model, X)
+
+
+@pytest.mark.parametrize('model_class', [LinearRegression, Ridge])
+def test_linear_matches_sklearn(data, model_class):
+    X, y = data
+    model = model_class().fit(X, y)
+    engine = compile_model(model)
+    assert isinstance(engine, FlatLinearModel)
+    assert_same_predictions(engine, model, X)
+
+
+def test_unsupported_models_are_served_as_is(data):
+    from sklearn.ensemble import AdaBoostRegressor
+    X, y = data
+    model = AdaBoostRegressor(n_estimators=5, random_state=0).fit(X, y)
+    assert compile_model(model) is model
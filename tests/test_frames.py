@@ -0,0 +1,25 @@
+import pandas as pd
+import pandas.testing as pdt
+import pytest
+
+from src.frames import load_frame, save_frame
+
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({
+        # As data_transformation leaves it: 0/1 codes as a categorical
+        'Leather_interior': pd.Series([1, 0, 1, 1]).astype('category'),
+        'Color': pd.Series(['Black', 'White', 'Black', 'Red']).astype('category'),
+        'Cylinders': pd.Series([4, 6, 4, 8]).astype(pd.CategoricalDtype([4, 6, 8, 12], ordered=True)),
+        'Price': [13328.0, 16621.0, 8467.0, 3607.0],
+    })
+
+
+@pytest.mark.parametrize('file_name', ['frame.parquet', 'frame.arrow'])
+def test_round_trip_keeps_dtypes(frame, tmp_path, file_name):
+    pytest.importorskip('pyarrow')
+    file_path = str(tmp_path / file_name)
+    save_frame(frame, file_path)
+    pdt.assert_frame_equal(load_frame(file_path), frame)
+    pdt.assert_frame_equal(load_frame(file_path, columns=['Leather_interior', 'Price']), frame[['Leather_interior', 'Price']])
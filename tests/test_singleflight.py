@@ -0,0 +1,116 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.encoder import FeatureEncoder
+from src.registry import ArtifactSnapshot
+from src.server.singleflight import SingleFlight
+from src.server.utils import PredictionService
+
+
+ARTIFACTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'artifacts')
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, 'condition not reached'
+        time.sleep(0.001)
+
+
+def test_waiters_share_the_leaders_result():
+    flights = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait()
+        return 42
+
+    with ThreadPoolExecutor(4) as executor:
+        leader = executor.submit(flights.do, 'car', compute)
+        wait_until(lambda: flights.stats()['in_flight'] == 1)
+        waiters = [executor.submit(flights.do, 'car', compute) for _ in range(3)]
+        wait_until(lambda: flights.stats()['coalesced'] == 3)
+        release.set()
+        assert [future.result() for future in [leader, *waiters]] == [42] * 4
+
+    assert calls == [1]
+    assert flights.stats()['in_flight'] == 0
+    # Nothing is kept once delivered
+    assert flights.do('car', lambda: 7) == 7
+
+
+def test_leaders_exception_reaches_its_waiters():
+    flights = SingleFlight()
+    release = threading.Event()
+
+    def fail():
+        release.wait()
+        raise ValueError('model failed')
+
+    with ThreadPoolExecutor(2) as executor:
+        leader = executor.submit(flights.do, 'car', fail)
+        wait_until(lambda: flights.stats()['in_flight'] == 1)
+        waiter = executor.submit(flights.do, 'car', lambda: pytest.fail('waiter computed'))
+        wait_until(lambda: flights.stats()['coalesced'] == 1)
+        release.set()
+        for future in (leader, waiter):
+            with pytest.raises(ValueError, match='model failed'):
+                future.result()
+
+    assert flights.stats()['in_flight'] == 0
+
+
+class StubModel:
+    """Prices a car from its encoded features, counting the rows it is given."""
+    def __init__(self):
+        self.rows = []
+
+    def predict(self, X):
+        self.rows.append(len(X))
+        return X.sum(axis=1) * 1000
+
+
+class StubRegistry:
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+
+    def get(self):
+        return self.snapshot
+
+
+@pytest.fixture
+def service():
+    service = PredictionService()
+    snapshot = ArtifactSnapshot(version='v1', artifacts={
+        'encoder': FeatureEncoder.from_artifacts(ARTIFACTS_DIR),
+        'model_rfr': StubModel(),
+    })
+    service.registry = StubRegistry(snapshot)
+    return service
+
+
+def test_batch_predicts_itself_when_the_leading_request_fails(service):
+    snapshot = service.registry.get()
+    cars = [{'levy': 1000, 'mileage': 20000}, {'levy': 2000}, {'levy': 1000, 'mileage': 20000}]
+    x = snapshot['encoder'].encode(cars[0])
+    key = (snapshot.version, 'model_rfr', service.prediction_cache.key(x))
+
+    # Another request is already predicting the first car
+    future, leader = service.in_flight.claim(key)
+    assert leader
+    with ThreadPoolExecutor(1) as executor:
+        batch = executor.submit(service.predict_used_car_prices, cars, coalesce=True)
+        wait_until(lambda: service.in_flight.stats()['coalesced'] == 1)
+        service.in_flight.resolve(key, future, exception=RuntimeError('shed'))
+        prices = batch.result()
+
+    # The second car led here, then each copy of the first once its leader failed
+    assert snapshot['model_rfr'].rows == [1, 1, 1]
+    expected = snapshot['model_rfr'].predict(snapshot['encoder'].encode_batch(cars)).astype(int).tolist()
+    assert prices == expected